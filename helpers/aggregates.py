@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from helpers.store import data_version, get_store
+
+# Bars in the Sanction Load histogram
+LOAD_BINS = 20
+
+
+def _columns(scope, *names):
+    """The named columns of the scope's cached frame, without copying the rest"""
+    return get_store().frame(scope)[list(names)]
+
+
+def _codes(column):
+    """(integer codes, labels) of a column; missing values get code -1"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(), column.cat.categories
+    return pd.factorize(column)
+
+
+def _numbers(column):
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype=np.float64)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _tariff_counts(scope, version):
+    codes, labels = _codes(_columns(scope, 'Tariff')['Tariff'])
+    counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    # Categories of rows outside scope stay on the column with a count of 0
+    df = pd.DataFrame({'Tariff': np.asarray(labels, dtype=object), 'Count': counts})
+    return df[df['Count'] > 0].sort_values('Count', ascending=False).reset_index(drop=True)
+
+
+def tariff_counts(scope):
+    """Meters per tariff within scope, largest first"""
+    return _tariff_counts(scope, data_version())
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _load_histogram(scope, bins, version):
+    load = _numbers(_columns(scope, 'Sanction Load')['Sanction Load'])
+    load = load[~np.isnan(load)]
+    if not len(load):
+        return pd.DataFrame(columns=['Sanction Load', 'Width', 'Count'])
+    low, high = load.min(), load.max()
+    width = (high - low) / bins or 1.0
+    # The maximum sits on the last bin's upper edge; clamp it into that bin
+    index = np.minimum(((load - low) / width).astype(np.int64), bins - 1)
+    return pd.DataFrame({
+        'Sanction Load': low + (np.arange(bins) + 0.5) * width,
+        'Width': width,
+        'Count': np.bincount(index, minlength=bins),
+    })
+
+
+def load_histogram(scope, bins=LOAD_BINS):
+    """Sanction Load histogram within scope: centre, width and meter count
+    of each of bins equal-width bins"""
+    return _load_histogram(scope, bins, data_version())
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _capacity_by_division(scope, version):
+    df = _columns(scope, 'Division', 'Transformer Capacity')
+    codes, labels = _codes(df['Division'])
+    capacity = np.nan_to_num(_numbers(df['Transformer Capacity']))
+    valid = codes >= 0
+    totals = np.bincount(codes[valid], weights=capacity[valid], minlength=len(labels))
+    present = np.bincount(codes[valid], minlength=len(labels)) > 0
+    return pd.DataFrame({
+        'Division': np.asarray(labels, dtype=object)[present],
+        'Transformer Capacity': totals[present],
+    })
+
+
+def capacity_by_division(scope):
+    """Summed Transformer Capacity per division within scope"""
+    return _capacity_by_division(scope, data_version())
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _installations_by_month(scope, version):
+    dates = pd.to_datetime(_columns(scope, 'Installation Date')['Installation Date'], errors='coerce').to_numpy()
+    months = dates[~np.isnat(dates)].astype('datetime64[M]').astype(np.int64)
+    if not len(months):
+        return pd.DataFrame(columns=['Installation Date', 'Count'])
+    first = months.min()
+    counts = np.bincount(months - first)
+    present = np.flatnonzero(counts)
+    return pd.DataFrame({
+        'Installation Date': np.datetime_as_string((present + first).astype('datetime64[M]')),
+        'Count': counts[present],
+    })
+
+
+def installations_by_month(scope):
+    """Meters installed per month (YYYY-MM) within scope"""
+    return _installations_by_month(scope, data_version())
@@ -1,6 +1,8 @@
 import streamlit as st
 import sqlite3
 import bcrypt
+from helpers.db import DB_PATH
+from helpers.migrations import ensure_schema
 
 def hash_password(password):
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -15,6 +17,9 @@ def check_authentication():
         st.switch_page("login.py")
         st.stop()
     
+    # Pages may query tables added by later migrations
+    ensure_schema(DB_PATH)
+    
     # Ensure access object exists
     if st.session_state.user_role != "admin" and not hasattr(st.session_state, 'access'):
         st.error("Access permissions not properly initialized")
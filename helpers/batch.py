@@ -0,0 +1,151 @@
+import re
+from contextlib import contextmanager
+import pandas as pd
+from helpers.db import reader, writer
+from helpers.importer import clean_reference, read_chunks
+from helpers.queries import BLANK_CONDITION, scope_condition, where_clause
+
+# Most reference numbers accepted in one batch
+BATCH_LIMIT = 5_000
+
+# Most reference numbers accepted in one admin bulk assignment
+BULK_LIMIT = 100_000
+
+# Columns shown for resolved meters
+BATCH_COLUMNS = ['Reference_no', 'Name', 'Division', 'Sub-Division', 'Feeder', 'Transformer', 'mute_reason']
+
+# Pasted lists may use newlines, commas, semicolons, tabs or spaces
+SEPARATORS = re.compile(r"[\s,;]+")
+
+# Meters updated per statement by assign_reason(), between progress reports
+ASSIGN_CHUNK = 5_000
+
+
+def parse_references(text):
+    """Reference numbers in a pasted list, in order"""
+    return [ref for ref in SEPARATORS.split(text or "") if ref]
+
+
+def references_from_upload(uploaded_file):
+    """Reference numbers in an uploaded CSV/XLSX: its Reference_no column,
+    or the first column if there is none"""
+    refs = []
+    for chunk in read_chunks(uploaded_file):
+        if chunk.columns.empty:
+            break
+        column = 'Reference_no' if 'Reference_no' in chunk.columns else chunk.columns[0]
+        refs.extend(clean_reference(value) for value in chunk[column].dropna())
+    return [ref for ref in refs if ref]
+
+
+def unique_references(refs):
+    """refs without repeats, first occurrence kept"""
+    return list(dict.fromkeys(refs))
+
+
+def _stage(conn, refs):
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS batch_refs (pos INTEGER PRIMARY KEY, Reference_no TEXT)"
+    )
+    conn.execute("DELETE FROM temp.batch_refs")
+    conn.executemany(
+        "INSERT INTO temp.batch_refs (pos, Reference_no) VALUES (?, ?)", enumerate(refs)
+    )
+
+
+@contextmanager
+def _staged(refs):
+    """reader() with refs staged in temp.batch_refs for the block.
+
+    Filling the temp table opens an implicit transaction on the shared
+    read connection. It is always ended here, rolled back on error, so the
+    connection is never left pinned to an old snapshot.
+    """
+    conn = reader()
+    try:
+        _stage(conn, refs)
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.execute("DELETE FROM temp.batch_refs")
+        conn.commit()
+
+
+def resolve_references(refs, scope):
+    """Looks up a list of reference numbers with one join.
+
+    Returns (found, missing, restricted): found is a DataFrame of
+    BATCH_COLUMNS in input order, missing the references with no meter and
+    restricted those outside scope.
+    """
+    condition, params = scope_condition(scope)
+    selected = ", ".join(f'meter_data."{c}"' for c in BATCH_COLUMNS[1:])
+    # batch_refs is private to this connection; nothing in main is written
+    with _staged(refs) as conn:
+        rows = conn.execute(
+            f"""
+            SELECT batch_refs.Reference_no, meter_data.Reference_no IS NOT NULL, ({condition}), {selected}
+            FROM temp.batch_refs LEFT JOIN meter_data ON meter_data.Reference_no = batch_refs.Reference_no
+            ORDER BY batch_refs.pos
+            """,
+            params
+        ).fetchall()
+
+    found = [(ref, *values) for ref, exists, visible, *values in rows if exists and visible]
+    missing = [ref for ref, exists, _, *_ in rows if not exists]
+    restricted = [ref for ref, exists, visible, *_ in rows if exists and not visible]
+    return pd.DataFrame(found, columns=BATCH_COLUMNS), missing, restricted
+
+
+def _target_sql(scope, refs, only_blank):
+    where, params = where_clause(scope)
+    source = "meter_data"
+    if refs is not None:
+        source += " JOIN temp.batch_refs ON batch_refs.Reference_no = meter_data.Reference_no"
+    if only_blank:
+        where += (" AND " if where else " WHERE ") + BLANK_CONDITION
+    return source + where, params
+
+
+def target_count(scope, refs=None, only_blank=True):
+    """Meters assign_reason() would update, for a preview"""
+    source, params = _target_sql(scope, refs, only_blank)
+    sql = f"SELECT COUNT(DISTINCT meter_data.rowid) FROM {source}"
+    if refs is None:
+        return reader().execute(sql, params).fetchone()[0]
+    with _staged(refs) as conn:
+        return conn.execute(sql, params).fetchone()[0]
+
+
+def assign_reason(reason, scope, refs=None, only_blank=True, progress=None):
+    """Sets reason on every meter within scope (and in refs, if given) in
+    one transaction; returns the number of meters updated.
+
+    With only_blank, meters that already have a reason are left alone, as
+    for a field submission. Targets are collected by rowid first and then
+    updated ASSIGN_CHUNK at a time, calling progress(done, total) after
+    each chunk.
+    """
+    with writer() as conn:
+        if refs is not None:
+            _stage(conn, refs)
+        source, params = _target_sql(scope, refs, only_blank)
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS assign_targets (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.assign_targets")
+        conn.execute(f"INSERT OR IGNORE INTO temp.assign_targets SELECT meter_data.rowid FROM {source}", params)
+        ids = [row[0] for row in conn.execute("SELECT id FROM temp.assign_targets ORDER BY id")]
+        for start in range(0, len(ids), ASSIGN_CHUNK):
+            chunk = ids[start:start + ASSIGN_CHUNK]
+            conn.execute(
+                "UPDATE meter_data SET mute_reason = ? WHERE rowid BETWEEN ? AND ? "
+                "AND rowid IN (SELECT id FROM temp.assign_targets)",
+                (reason, chunk[0], chunk[-1])
+            )
+            if progress:
+                progress(start + len(chunk), len(ids))
+        conn.execute("DELETE FROM temp.assign_targets")
+        if refs is not None:
+            conn.execute("DELETE FROM temp.batch_refs")
+    return len(ids)
@@ -0,0 +1,13 @@
+# Reasons offered to the field when tagging a mute meter
+MUTE_REASONS = [
+    "Cable Jumper Loose", "Extra Phase Wire Loop", "GPRS Meter Bypass",
+    "Meter Washout", "Network Error", "Offline Due To Load Sheading",
+    "Screen Opened Slow", "SIM Card Faulty", "Structure Fallen Down",
+    "T/B Lock Heatup Slow", "Units Pending", "Running Direct", "Transformer Not At Site",
+    "No Communication", "D-FUSE Cut Off", "Service Drop Disconnected", "MDI Supply Fail",
+    "Display Opened", "Not In Use", "Not Found", "Pending Units",
+    "Supply Cut Off Due To Non-Payment", "MCO Not Take Up", "T/F Not At Site",
+    "Transformer Faulty", "T/F Burnt", "11KV Line Disconnected", "Wash Out",
+    "Meter Line Disconnected", "Meter Burnt", "LT Line Disconnected", "HT Line Disconnect",
+    "No Meter At Site"
+]
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from helpers.store import data_version, get_store
+
+# Sanction Load band edges (kW); the last band is open-ended
+LOAD_BAND_EDGES = [0, 1, 2, 5, 10, 20, 50, 100, 500]
+LOAD_BANDS = [
+    f"{low}–{high} kW" for low, high in zip(LOAD_BAND_EDGES, LOAD_BAND_EDGES[1:])
+] + [f"{LOAD_BAND_EDGES[-1]}+ kW"]
+
+# Cube dimensions, in default drill-down order
+DIMENSIONS = ['Tariff', 'Division', 'Load Band', 'Meter Type']
+
+# Label for missing or blank dimension values
+UNKNOWN = "Unknown"
+
+MEASURES = ['Meters', 'Sanction Load (kW)']
+
+
+def _dimension(df, name):
+    """(codes, labels) for one dimension, with missing and blank values
+    labelled UNKNOWN"""
+    if name == 'Load Band':
+        load = pd.to_numeric(df['Sanction Load'], errors='coerce').to_numpy(dtype=np.float64)
+        # 0 for NaN and negative loads, which fall outside the edges
+        band = np.searchsorted(LOAD_BAND_EDGES, load, side='right')
+        band[np.isnan(load)] = 0
+        return band, [UNKNOWN] + LOAD_BANDS
+    column = df[name]
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes, labels = column.cat.codes.to_numpy(), column.cat.categories
+    else:
+        codes, labels = pd.factorize(column)
+    labels = [str(label).strip() or UNKNOWN for label in labels]
+    return codes + 1, [UNKNOWN] + labels
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _build_cube(scope, version):
+    df = get_store().frame(scope)[['Tariff', 'Division', 'Sanction Load', 'Meter Type']]
+
+    # One integer key per meter across all dimensions; a single np.unique
+    # pass then counts every combination that occurs
+    key = np.zeros(len(df), dtype=np.int64)
+    dimensions = [_dimension(df, name) for name in DIMENSIONS]
+    for codes, labels in dimensions:
+        key = key * len(labels) + codes
+    cells, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+    load = np.nan_to_num(pd.to_numeric(df['Sanction Load'], errors='coerce').to_numpy(dtype=np.float64))
+
+    columns = {}
+    for name, (_, labels) in reversed(list(zip(DIMENSIONS, dimensions))):
+        cells, codes = np.divmod(cells, len(labels))
+        columns[name] = np.asarray(labels, dtype=object)[codes]
+    cube = pd.DataFrame({name: columns[name] for name in DIMENSIONS})
+    cube['Meters'] = counts
+    cube['Sanction Load (kW)'] = np.bincount(inverse, weights=load, minlength=len(counts))
+    # Blank and missing values share the UNKNOWN label; fold their cells
+    return cube.groupby(DIMENSIONS, as_index=False, sort=False).sum()
+
+
+def tariff_cube(scope):
+    """Meters and summed Sanction Load per Tariff x Division x Load Band x
+    Meter Type combination within scope, cached per data version. Only
+    combinations that occur are stored, so slices are cheap."""
+    return _build_cube(scope, data_version())
+
+
+def slice_cube(cube, filters):
+    """Cells matching every {dimension: value} in filters"""
+    mask = np.ones(len(cube), dtype=bool)
+    for name, value in filters.items():
+        mask &= (cube[name] == value).to_numpy()
+    return cube[mask]
+
+
+def rollup(cube, by):
+    """Measures summed over the dimensions not in by, largest first"""
+    if not by:
+        return cube[MEASURES].sum().to_frame().T
+    return cube.groupby(by, as_index=False, sort=False)[MEASURES].sum().sort_values('Meters', ascending=False)
@@ -0,0 +1,48 @@
+import datetime
+
+# Date layouts accepted from the AMR feed and hand-edited sheets, tried in
+# order. Numeric dates are day first (dd/mm/yyyy), as in all source data.
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y/%m/%d',
+    '%d/%m/%Y', '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%d-%m-%Y', '%d.%m.%Y', '%d/%m/%y',
+    '%d-%b-%Y', '%d-%b-%y', '%d %b %Y', '%d %B %Y',
+    '%b %d, %Y', '%B %d, %Y', '%b %d %Y', '%B %d %Y',
+]
+
+
+def is_blank(value):
+    return value is None or value != value or str(value).strip() == ''
+
+
+def _parse_date(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime('%Y-%m-%d')
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+def parse_dates(values):
+    """ISO 8601 dates (YYYY-MM-DD) for free-text values, each parsed on its
+    own against DATE_FORMATS. Blank values and values matching no format
+    give None; see is_date_reject() to tell the two apart."""
+    parsed = {}
+    result = []
+    for value in values:
+        if is_blank(value):
+            result.append(None)
+            continue
+        key = value if isinstance(value, str) else repr(value)
+        if key not in parsed:
+            parsed[key] = _parse_date(value)
+        result.append(parsed[key])
+    return result
+
+
+def is_date_reject(value, parsed):
+    """Whether a value was given but parse_dates() could not read it"""
+    return parsed is None and not is_blank(value)
@@ -0,0 +1,135 @@
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+DB_PATH = "sepco_meters.db"
+
+# Seconds a statement waits for another process's lock before failing
+BUSY_TIMEOUT = 30
+
+# Prepared statements kept per connection; connections are long-lived, so
+# repeated queries skip re-parsing
+CACHED_STATEMENTS = 256
+
+# Read connections kept open between threads. Streamlit runs each rerun on
+# a new thread, so a connection is handed back when its thread ends and
+# the next rerun picks it up, statement cache included.
+MAX_IDLE_READERS = 8
+
+# WAL lets readers keep going while a write is committing. The mode is
+# stored in the database file, so setting it again is a no-op.
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA temp_store = MEMORY",
+]
+
+# The writer also does bulk imports; give it a larger page cache (KiB)
+WRITER_PRAGMAS = [
+    "PRAGMA cache_size = -65536",
+]
+
+# Changes to meter_data are logged under the next data version (migration
+# v10); a write transaction that logged any publishes that version once,
+# just before it commits. hierarchy_version follows it when one of the
+# changes could move the hierarchy tree (migration v11).
+PUBLISH_VERSION = """
+    UPDATE data_version SET
+        version = version + 1,
+        hierarchy_version = CASE
+            WHEN EXISTS (SELECT 1 FROM meter_changes WHERE version > data_version.version AND hierarchy)
+            THEN version + 1 ELSE hierarchy_version
+        END
+    WHERE id = 1 AND EXISTS (SELECT 1 FROM meter_changes WHERE version > data_version.version)
+"""
+
+_local = threading.local()
+_idle_readers = []
+_idle_lock = threading.Lock()
+# Bumped to retire every pooled connection (e.g. when DB_PATH changes)
+_reader_generation = 0
+_write_lock = threading.Lock()
+_write_conn = None
+
+
+def connect(db_path=DB_PATH, **kwargs):
+    """New connection with the shared settings applied"""
+    conn = sqlite3.connect(
+        db_path, timeout=BUSY_TIMEOUT, cached_statements=CACHED_STATEMENTS, **kwargs
+    )
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class _Lease:
+    """A pooled read connection held by one thread until it ends"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        weakref.finalize(self, _release_reader, conn, _reader_generation)
+
+
+def _release_reader(conn, generation):
+    # Runs once the leasing thread has ended, so no one else uses conn
+    if conn.in_transaction:
+        conn.rollback()
+    with _idle_lock:
+        if generation == _reader_generation and len(_idle_readers) < MAX_IDLE_READERS:
+            _idle_readers.append(conn)
+            return
+    conn.close()
+
+
+def reader():
+    """This thread's read connection, taken from the idle pool (or opened)
+    on first use and returned to it when the thread ends.
+
+    Use it for SELECTs only; all writes go through writer().
+    """
+    lease = getattr(_local, 'lease', None)
+    if lease is None:
+        with _idle_lock:
+            conn = _idle_readers.pop() if _idle_readers else None
+        if conn is None:
+            conn = connect(check_same_thread=False)
+        lease = _local.lease = _Lease(conn)
+    return lease.conn
+
+
+@contextmanager
+def writer(attach=None):
+    """Write transaction on the process's single write connection.
+
+    Writers queue on a lock instead of racing for SQLite's, so concurrent
+    submissions wait their turn rather than failing with 'database is
+    locked'. Commits on success, rolls back on error.
+
+    attach maps schema names to other database files that the transaction
+    also writes. They are attached for its duration only, since SQLite
+    cannot attach inside a transaction.
+    """
+    global _write_conn
+    with _write_lock:
+        if _write_conn is None:
+            _write_conn = connect(isolation_level=None, check_same_thread=False)
+            for pragma in WRITER_PRAGMAS:
+                _write_conn.execute(pragma)
+        conn = _write_conn
+        attached = []
+        try:
+            for schema, path in (attach or {}).items():
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+                attached.append(schema)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute(PUBLISH_VERSION)
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+        finally:
+            for schema in attached:
+                conn.execute(f"DETACH DATABASE {schema}")
@@ -0,0 +1,132 @@
+import csv
+import io
+import json
+import tempfile
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from helpers.queries import METER_KEY, MUTE_CONDITION, where_clause
+from helpers.db import reader
+
+# Rows pulled from the cursor per fetchmany(); memory stays at one chunk
+CHUNK_SIZE = 10_000
+
+# Rows shown in on-page previews of an export
+PREVIEW_ROWS = 1_000
+
+EXPORT_FORMATS = {
+    'xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    'csv': "text/csv",
+    'json': "application/json",
+    'ndjson': "application/x-ndjson",
+}
+
+
+def export_query(scope, mute_only=False):
+    """SELECT for the rows an export covers: returns (sql, params)"""
+    where, params = where_clause(scope)
+    if mute_only:
+        where += (" AND " if where else " WHERE ") + MUTE_CONDITION
+    columns = ", ".join(
+        f'"{name}"' for _, name, *_ in reader().execute("PRAGMA table_info(meter_data)")
+        if name != METER_KEY
+    )
+    return f"SELECT {columns} FROM meter_data" + where, params
+
+
+def iter_chunks(cursor, progress=None, chunk_size=CHUNK_SIZE):
+    """Yields fetchmany() batches; progress(rows_done) is called after each"""
+    done = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+        done += len(rows)
+        if progress:
+            progress(done)
+
+
+def write_csv(cursor, out, progress=None):
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow([d[0] for d in cursor.description])
+    for rows in iter_chunks(cursor, progress):
+        writer.writerows(rows)
+    text.flush()
+    text.detach()
+
+
+def _write_records(cursor, out, opening, separator, closing, progress=None):
+    columns = [d[0] for d in cursor.description]
+    out.write(opening)
+    first = True
+    for rows in iter_chunks(cursor, progress):
+        for row in rows:
+            if not first:
+                out.write(separator)
+            out.write(json.dumps(dict(zip(columns, row))).encode('utf-8'))
+            first = False
+    out.write(closing)
+
+
+def write_json(cursor, out, progress=None):
+    # Same records-array layout as DataFrame.to_json(orient='records')
+    _write_records(cursor, out, b"[", b",", b"]", progress)
+
+
+def write_ndjson(cursor, out, progress=None):
+    _write_records(cursor, out, b"", b"\n", b"\n", progress)
+
+
+def _clean_cell(value):
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS_RE.sub('', value)
+    return value
+
+
+def write_xlsx(cursor, out, progress=None):
+    # Write-only workbooks stream rows to disk instead of building cell objects
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([d[0] for d in cursor.description])
+    for rows in iter_chunks(cursor, progress):
+        for row in rows:
+            ws.append([_clean_cell(v) for v in row])
+    wb.save(out)
+
+
+WRITERS = {
+    'xlsx': write_xlsx,
+    'csv': write_csv,
+    'json': write_json,
+    'ndjson': write_ndjson,
+}
+
+
+def count_rows(sql, params):
+    return reader().execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+
+
+def preview_rows(sql, params, limit=PREVIEW_ROWS):
+    """First rows of an export query, with every column, for on-page previews"""
+    return pd.read_sql_query(f"{sql} LIMIT ?", reader(), params=list(params) + [limit])
+
+
+def build_export(fmt, sql, params, out=None, progress=None):
+    """Streams the query result into out (a temp file by default), rewound"""
+    if out is None:
+        out = tempfile.TemporaryFile()
+    cursor = reader().execute(sql, params)
+    try:
+        WRITERS[fmt](cursor, out, progress)
+    finally:
+        cursor.close()
+    out.seek(0)
+    return out
+
+
+def export_builder(fmt, sql, params):
+    """Zero-argument callable for st.download_button, so the file is only
+    built when the user actually clicks that format's button"""
+    return lambda: build_export(fmt, sql, params)
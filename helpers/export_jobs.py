@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from helpers.export import EXPORT_FORMATS, build_export, count_rows, export_query
+from helpers.store import data_version
+
+CACHE_DIR = "export_cache"
+MAX_WORKERS = 2
+# Artifacts kept on disk; the least recently written ones go first
+MAX_ARTIFACTS = 50
+
+FORMAT_LABELS = {
+    'xlsx': "💾 Excel",
+    'csv': "📄 CSV",
+    'json': "📊 JSON",
+    'ndjson': "📊 NDJSON",
+}
+
+
+class ExportJob:
+    """State of one export artifact, shared by every session asking for it"""
+
+    def __init__(self, key, fmt, path):
+        self.key = key
+        self.fmt = fmt
+        self.path = path
+        self.state = 'queued'  # queued -> running -> done | failed
+        self.rows_done = 0
+        self.rows_total = None
+        self.error = None
+
+    @property
+    def progress(self):
+        if self.state == 'done':
+            return 1.0
+        if not self.rows_total:
+            return 0.0
+        return min(self.rows_done / self.rows_total, 1.0)
+
+
+class ExportJobQueue:
+    """Runs exports on a worker pool and keeps finished files in CACHE_DIR.
+
+    Artifacts are keyed by (scope, data type, format, data version), so an
+    identical request is served from disk until the data changes.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_workers=MAX_WORKERS):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def _key(self, scope, mute_only, fmt):
+        spec = json.dumps([sorted(scope.items()), mute_only, fmt, data_version()])
+        return hashlib.sha1(spec.encode('utf-8')).hexdigest()
+
+    def _lookup(self, key, fmt):
+        # Caller holds the lock
+        job = self._jobs.get(key)
+        if job is None:
+            path = os.path.join(self.cache_dir, f"{key}.{fmt}")
+            if os.path.exists(path):
+                job = self._jobs[key] = ExportJob(key, fmt, path)
+                job.state = 'done'
+        return job
+
+    def get(self, scope, mute_only, fmt):
+        """Existing job or cached artifact for a request, else None"""
+        key = self._key(scope, mute_only, fmt)
+        with self._lock:
+            return self._lookup(key, fmt)
+
+    def submit(self, scope, mute_only, fmt):
+        """Queues an export unless the same one is cached or already running"""
+        key = self._key(scope, mute_only, fmt)
+        # Looked up and registered under one lock hold, so two sessions
+        # asking at once share a job instead of both queueing one
+        with self._lock:
+            job = self._lookup(key, fmt)
+            if job is not None and job.state != 'failed':
+                return job
+            job = self._jobs[key] = ExportJob(key, fmt, os.path.join(self.cache_dir, f"{key}.{fmt}"))
+        self._pool.submit(self._run, job, *export_query(scope, mute_only))
+        return job
+
+    def discard(self, job):
+        """Forgets a finished job whose file has gone, so it can be prepared again"""
+        with self._lock:
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+
+    def _run(self, job, sql, params):
+        job.state = 'running'
+        partial = job.path + ".part"
+        try:
+            job.rows_total = count_rows(sql, params)
+            with open(partial, 'wb') as out:
+                build_export(job.fmt, sql, params, out=out, progress=self._progress(job))
+            os.replace(partial, job.path)
+            job.state = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.state = 'failed'
+            if os.path.exists(partial):
+                os.remove(partial)
+            return
+        # Housekeeping only: a prune that fails never fails the export, and
+        # is tried again after the next one
+        try:
+            self._prune()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _progress(job):
+        def update(rows_done):
+            job.rows_done = rows_done
+        return update
+
+    def _prune(self):
+        # Another worker may be pruning at the same time; files that vanish
+        # in between are skipped
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".part"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                files.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+        files.sort(reverse=True)
+        for _, path in files[MAX_ARTIFACTS:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            key = os.path.basename(path).split(".")[0]
+            with self._lock:
+                self._jobs.pop(key, None)
+
+
+@st.cache_resource
+def get_export_jobs():
+    return ExportJobQueue()
+
+
+def export_panel(scope, mute_only, formats, file_name, key):
+    """One prepare/download control per format, side by side"""
+    for col, fmt in zip(st.columns(len(formats)), formats):
+        with col:
+            _export_control(scope, mute_only, fmt, file_name, f"{key}_{fmt}")
+
+
+def _export_control(scope, mute_only, fmt, file_name, key):
+    jobs = get_export_jobs()
+    job = jobs.get(scope, mute_only, fmt)
+    label = FORMAT_LABELS[fmt]
+
+    if job is not None and job.state == 'done' and not os.path.exists(job.path):
+        # Pruned by a newer export since it finished
+        jobs.discard(job)
+        job = None
+
+    if job is None or job.state == 'failed':
+        if job is not None:
+            st.error(f"❌ Export failed: {job.error}")
+        if st.button(f"Prepare {label}", key=key, use_container_width=True):
+            job = jobs.submit(scope, mute_only, fmt)
+
+    if job is not None and job.state in ('queued', 'running'):
+        _job_progress(job, label)
+
+    if job is not None and job.state == 'done':
+        st.download_button(
+            label=f"Download {label}",
+            data=_artifact_reader(job.path),
+            file_name=f"{file_name}.{fmt}",
+            mime=EXPORT_FORMATS[fmt],
+            key=f"{key}_download",
+            use_container_width=True
+        )
+
+
+def _artifact_reader(path):
+    """Reads a finished export only when its download button is clicked,
+    not on every rerun of the page"""
+    def read():
+        with open(path, 'rb') as f:
+            return f.read()
+    return read
+
+
+@st.fragment(run_every="1s")
+def _job_progress(job, label):
+    # Only this fragment polls while the job runs; the page reruns once it ends
+    if job.state in ('done', 'failed'):
+        st.rerun()
+    total = f"{job.rows_total:,}" if job.rows_total is not None else "…"
+    st.progress(job.progress, text=f"{label}: {job.rows_done:,} / {total} rows")
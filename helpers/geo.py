@@ -0,0 +1,179 @@
+import math
+import numpy as np
+import pandas as pd
+import streamlit as st
+from helpers.db import reader
+from helpers.queries import MUTE_CONDITION, where_clause
+from helpers.store import data_version
+
+# Map zoom levels offered on the Geographic Distribution tab
+MIN_ZOOM = 4
+MAX_ZOOM = 14
+DEFAULT_ZOOM = 6
+
+# Grid cells per map tile edge; a cell is roughly a 64px square on screen
+CELLS_PER_TILE = 4
+
+# Views with at most this many mute meters are drawn point by point
+POINT_LIMIT = 5_000
+
+# Upper bound on cluster markers; the grid is coarsened until it fits
+MAX_CLUSTERS = 2_000
+
+# Reasons listed in a cluster's hover text
+BREAKDOWN_REASONS = 5
+
+# Columns returned by the bbox and radius queries
+MAP_COLUMNS = ['Reference_no', 'Name', 'Division', 'Sub-Division', 'Feeder', 'Latitude', 'Longitude', 'mute_reason']
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+# Coordinates outside these ranges are data errors, not locations
+VALID_COORDINATES = [
+    ("Latitude BETWEEN ? AND ?", (-90, 90)),
+    ("Longitude BETWEEN ? AND ?", (-180, 180)),
+]
+
+
+def cell_size(zoom):
+    """Edge of a grid cell in degrees at a web-map zoom level"""
+    return 360 / (2 ** zoom) / CELLS_PER_TILE
+
+
+def cell_bounds(lat, lon, zoom):
+    """(min_lat, max_lat, min_lon, max_lon) of the grid cell holding a point"""
+    cell = cell_size(zoom)
+    row = math.floor((lat + 90) / cell)
+    col = math.floor((lon + 180) / cell)
+    return row * cell - 90, (row + 1) * cell - 90, col * cell - 180, (col + 1) * cell - 180
+
+
+def _mute_where(scope):
+    where, params = where_clause(scope)
+    conditions = [MUTE_CONDITION] + [condition for condition, _ in VALID_COORDINATES]
+    where += (" AND " if where else " WHERE ") + " AND ".join(conditions)
+    for _, bounds in VALID_COORDINATES:
+        params.extend(bounds)
+    return where, params
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _cell_counts(scope, zoom, version):
+    where, params = _mute_where(scope)
+    cell = cell_size(zoom)
+    # Offsets keep the cell numbers positive, so CAST truncation is floor()
+    return pd.read_sql_query(
+        f"""
+        SELECT CAST((Latitude + 90) / ? AS INTEGER) AS cell_row,
+               CAST((Longitude + 180) / ? AS INTEGER) AS cell_col,
+               TRIM(mute_reason) AS mute_reason,
+               COUNT(*) AS count,
+               SUM(Latitude) AS lat_sum,
+               SUM(Longitude) AS lon_sum
+        FROM meter_data{where}
+        GROUP BY cell_row, cell_col, TRIM(mute_reason)
+        """,
+        reader(),
+        params=[cell, cell] + params
+    )
+
+
+def mute_point_count(scope):
+    """Mute meters with usable coordinates within scope"""
+    where, params = _mute_where(scope)
+    return reader().execute("SELECT COUNT(*) FROM meter_data" + where, params).fetchone()[0]
+
+
+def mute_points(scope):
+    """Individual mute meters for small views, with the map's hover columns"""
+    where, params = _mute_where(scope)
+    return pd.read_sql_query(
+        "SELECT Reference_no, Name, Feeder, Division, Latitude, Longitude, TRIM(mute_reason) AS mute_reason "
+        "FROM meter_data" + where,
+        reader(),
+        params=params
+    )
+
+
+def mute_clusters(scope, zoom):
+    """Mute meters binned into grid cells sized for the zoom level.
+
+    Returns (clusters, zoom): one row per cell with its centroid, total
+    count, most common reason and a per-reason breakdown, plus the zoom the
+    grid was actually built at (coarser than asked if the requested grid
+    would exceed MAX_CLUSTERS). Per-reason cell counts are cached per data
+    version, so repeat views skip the scan.
+    """
+    version = data_version()
+    while True:
+        counts = _cell_counts(scope, zoom, version)
+        cells = counts[['cell_row', 'cell_col']].drop_duplicates()
+        if len(cells) <= MAX_CLUSTERS or zoom <= MIN_ZOOM:
+            break
+        zoom -= 1
+
+    if counts.empty:
+        return pd.DataFrame(columns=['Latitude', 'Longitude', 'count', 'top_reason', 'breakdown']), zoom
+
+    counts = counts.sort_values(['cell_row', 'cell_col', 'count'], ascending=[True, True, False])
+    cells = counts.groupby(['cell_row', 'cell_col'], sort=False)
+    clusters = cells.agg(
+        count=('count', 'sum'),
+        lat_sum=('lat_sum', 'sum'),
+        lon_sum=('lon_sum', 'sum'),
+        top_reason=('mute_reason', 'first'),
+    )
+    clusters['Latitude'] = clusters['lat_sum'] / clusters['count']
+    clusters['Longitude'] = clusters['lon_sum'] / clusters['count']
+    clusters['breakdown'] = cells.apply(
+        lambda g: "<br>".join(
+            f"{r}: {c}" for r, c in zip(g['mute_reason'][:BREAKDOWN_REASONS], g['count'])
+        ),
+        include_groups=False
+    )
+    clusters = clusters.reset_index(drop=True)
+    return clusters[['Latitude', 'Longitude', 'count', 'top_reason', 'breakdown']], zoom
+
+
+def meters_in_bbox(scope, min_lat, max_lat, min_lon, max_lon, mute_only=False, columns=MAP_COLUMNS):
+    """Meters within scope inside a lat/lon box, looked up through meter_rtree"""
+    where, params = where_clause(scope, [
+        ("meter_rtree.max_lat >= ?", min_lat),
+        ("meter_rtree.min_lat <= ?", max_lat),
+        ("meter_rtree.max_lon >= ?", min_lon),
+        ("meter_rtree.min_lon <= ?", max_lon),
+    ])
+    if mute_only:
+        where += " AND " + MUTE_CONDITION
+    selected = ", ".join(f'meter_data."{c}"' for c in columns)
+    df = pd.read_sql_query(
+        f"SELECT {selected} FROM meter_rtree JOIN meter_data ON meter_data.meter_id = meter_rtree.id" + where,
+        reader(),
+        params=params
+    )
+    # The R*Tree stores 32-bit bounds rounded outwards; trim to the exact box
+    inside = df['Latitude'].between(min_lat, max_lat) & df['Longitude'].between(min_lon, max_lon)
+    return df[inside].reset_index(drop=True)
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distances in km from one point to arrays of points"""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def meters_within(scope, lat, lon, radius_km, mute_only=False, columns=MAP_COLUMNS):
+    """Meters within scope and radius_km of a point, nearest first.
+
+    The bounding box of the circle is read through the spatial index, then
+    trimmed by exact distance; adds a distance_km column.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    df = meters_in_bbox(scope, lat - dlat, lat + dlat, lon - dlon, lon + dlon, mute_only, columns)
+    df['distance_km'] = haversine_km(lat, lon, df['Latitude'].to_numpy(), df['Longitude'].to_numpy())
+    df = df[df['distance_km'] <= radius_km]
+    return df.sort_values('distance_km').reset_index(drop=True)
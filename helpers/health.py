@@ -0,0 +1,160 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+import streamlit as st
+from helpers.db import reader, writer
+from helpers.queries import where_clause
+from helpers.store import data_version, get_store, is_mute
+
+# Seconds between background checks; scores are only recomputed when the
+# data version has moved since the last run
+HEALTH_INTERVAL = 15 * 60
+
+# Weights of the two risk components in the 0-100 score
+MUTE_WEIGHT = 0.6
+OVERLOAD_WEIGHT = 0.4
+
+# Load-to-capacity ratio at which the overload component is maxed out;
+# at or below 1.0 it is zero
+FULL_OVERLOAD = 2.0
+
+# Reasons listed in reason_mix, most common first
+MIX_REASONS = 3
+
+TRANSFORMER_KEY = ['Circle', 'Division', 'Sub-Division', 'Feeder', 'Transformer']
+FEEDER_KEY = TRANSFORMER_KEY[:-1]
+
+SCORE_COLUMNS = [
+    'level', *TRANSFORMER_KEY, 'meters', 'mute', 'mute_ratio', 'sanctioned_kw', 'capacity_kva',
+    'load_ratio', 'top_reason', 'reason_mix', 'score',
+]
+
+
+def _reason_mix(mute_rows, key):
+    """Top reason and 'reason (count), ...' of the mute meters per key"""
+    counts = mute_rows.groupby(key + ['reason'], observed=True, dropna=False, sort=False).size()
+    counts = counts.reset_index(name='count').sort_values('count', ascending=False, kind='stable')
+    counts = counts.groupby(key, observed=True, dropna=False, sort=False).head(MIX_REASONS)
+    counts['label'] = counts['reason'].astype(str) + " (" + counts['count'].astype(str) + ")"
+    groups = counts.groupby(key, observed=True, dropna=False, sort=False)
+    return pd.DataFrame({
+        'top_reason': groups['reason'].first(),
+        'reason_mix': groups['label'].agg(", ".join),
+    })
+
+
+def _score(groups, level, mix):
+    groups = groups.join(mix)
+    groups['mute_ratio'] = groups['mute'] / groups['meters']
+    capacity = groups['capacity_kva'].where(groups['capacity_kva'] > 0)
+    groups['load_ratio'] = groups['sanctioned_kw'] / capacity
+    overload = ((groups['load_ratio'] - 1) / (FULL_OVERLOAD - 1)).clip(0, 1).fillna(0)
+    groups['score'] = 100 * (MUTE_WEIGHT * groups['mute_ratio'] + OVERLOAD_WEIGHT * overload)
+    groups = groups.reset_index()
+    groups['level'] = level
+    if 'Transformer' not in groups:
+        groups['Transformer'] = ''
+    for column in TRANSFORMER_KEY:
+        groups[column] = groups[column].astype(object).where(groups[column].notna(), '')
+    return groups[SCORE_COLUMNS]
+
+
+def compute_health_scores(df):
+    """Health scores per transformer and per feeder from a meter frame.
+
+    mute_ratio is mute meters over meters. load_ratio is sanctioned load
+    (kW) over transformer capacity (kVA, taken as kW). A transformer's
+    capacity is the value its meters carry; a feeder's is the sum over its
+    transformers. score (0-100, worse is higher) weighs the mute ratio
+    against overload beyond 100% of capacity.
+    """
+    # Same rule as queries.MUTE_CONDITION: NULL and blank reasons are not mute
+    mute = is_mute(df).to_numpy()
+    meters = pd.DataFrame({
+        **{column: df[column] for column in TRANSFORMER_KEY},
+        'mute': mute,
+        'load': pd.to_numeric(df['Sanction Load'], errors='coerce').fillna(0).to_numpy(dtype=np.float64),
+        'capacity': pd.to_numeric(df['Transformer Capacity'], errors='coerce').to_numpy(dtype=np.float64),
+    })
+    mute_rows = meters[mute].copy()
+    mute_rows['reason'] = df.loc[mute, 'mute_reason'].astype(str).str.strip().to_numpy()
+
+    transformers = meters.groupby(TRANSFORMER_KEY, observed=True, dropna=False, sort=False).agg(
+        meters=('mute', 'size'),
+        mute=('mute', 'sum'),
+        sanctioned_kw=('load', 'sum'),
+        capacity_kva=('capacity', 'max'),
+    )
+    feeders = transformers.groupby(FEEDER_KEY, observed=True, dropna=False, sort=False).agg(
+        meters=('meters', 'sum'),
+        mute=('mute', 'sum'),
+        sanctioned_kw=('sanctioned_kw', 'sum'),
+        capacity_kva=('capacity_kva', lambda c: c.sum(min_count=1)),
+    )
+    return pd.concat([
+        _score(transformers, 'transformer', _reason_mix(mute_rows, TRANSFORMER_KEY)),
+        _score(feeders, 'feeder', _reason_mix(mute_rows, FEEDER_KEY)),
+    ], ignore_index=True)
+
+
+def run_health_scores(store=None):
+    """Recomputes health_scores over the full fleet; returns rows written"""
+    version = data_version()
+    scores = compute_health_scores((store or get_store()).frame())
+    scores = scores.astype(object).where(scores.notna(), None)
+    columns = ", ".join(f'"{c}"' for c in SCORE_COLUMNS)
+    with writer() as conn:
+        conn.execute("DELETE FROM health_scores")
+        conn.executemany(
+            f"INSERT INTO health_scores ({columns}, data_version, computed_at) "
+            f"VALUES ({', '.join('?' for _ in SCORE_COLUMNS)}, ?, datetime('now', 'localtime'))",
+            (row + (version,) for row in scores.itertuples(index=False, name=None))
+        )
+    return len(scores)
+
+
+def scores_version():
+    """(data version, computed at) of the stored scores, or (None, None)"""
+    row = reader().execute("SELECT data_version, computed_at FROM health_scores LIMIT 1").fetchone()
+    return row or (None, None)
+
+
+class HealthScoreJob:
+    """Background thread that keeps health_scores current.
+
+    Every HEALTH_INTERVAL seconds it compares the scores' data version with
+    the database's and reruns the scoring when they differ.
+    """
+
+    def __init__(self, store, interval=HEALTH_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="health-scores", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                if scores_version()[0] != data_version():
+                    run_health_scores(self.store)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+            time.sleep(self.interval)
+
+
+@st.cache_resource
+def get_health_job():
+    return HealthScoreJob(get_store())
+
+
+def health_scores(scope, level, limit=None):
+    """Stored scores for one level ('transformer' or 'feeder') within scope,
+    worst first"""
+    where, params = where_clause(scope, [("level = ?", level)])
+    sql = f"SELECT * FROM health_scores{where} ORDER BY score DESC, mute DESC"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    return pd.read_sql_query(sql, reader(), params=params)
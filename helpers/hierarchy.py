@@ -0,0 +1,90 @@
+import streamlit as st
+from helpers.db import reader
+from helpers.queries import HIERARCHY
+
+LEVELS = [key for key, _ in HIERARCHY]
+
+
+def _node():
+    return {'count': 0, 'children': {}}
+
+
+class HierarchyTree:
+    """Circle -> Division -> Sub-Division -> Feeder, with meter counts per node.
+
+    Built from one GROUP BY over the hierarchy index; option lookups then
+    only visit the children of the selected nodes.
+    """
+
+    def __init__(self, rows):
+        self.root = _node()
+        for *path, count in rows:
+            node = self.root
+            node['count'] += count
+            for value in path:
+                node = node['children'].setdefault(value, _node())
+                node['count'] += count
+
+    def _walk(self, scope, depth):
+        """Nodes at depth whose path satisfies the scope's upper levels"""
+        nodes = [self.root]
+        for key in LEVELS[:depth]:
+            wanted = scope.get(key)
+            if wanted:
+                nodes = [node['children'][wanted] for node in nodes if wanted in node['children']]
+            else:
+                nodes = [child for node in nodes for child in node['children'].values()]
+        return nodes
+
+    def _contains(self, node, depth, scope):
+        """Whether the subtree below node has a path matching the scope's deeper levels"""
+        if not any(scope.get(key) for key in LEVELS[depth:]):
+            return True
+        wanted = scope.get(LEVELS[depth])
+        if wanted:
+            child = node['children'].get(wanted)
+            return child is not None and self._contains(child, depth + 1, scope)
+        return any(self._contains(child, depth + 1, scope) for child in node['children'].values())
+
+    def options(self, scope, key):
+        """Sorted values at level key that have meters within scope"""
+        depth = LEVELS.index(key)
+        values = set()
+        for parent in self._walk(scope, depth):
+            for value, child in parent['children'].items():
+                if value is None or value in values:
+                    continue
+                if scope.get(key) and value != scope[key]:
+                    continue
+                if self._contains(child, depth + 1, scope):
+                    values.add(value)
+        return sorted(values)
+
+    def count(self, scope):
+        """Number of meters within scope"""
+        constrained = [i for i, key in enumerate(LEVELS) if scope.get(key)]
+        depth = constrained[-1] + 1 if constrained else 0
+        return sum(node['count'] for node in self._walk(scope, depth))
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _build_tree(version):
+    columns = ", ".join(f'"{column}"' for _, column in HIERARCHY)
+    rows = reader().execute(f'SELECT {columns}, COUNT(*) FROM meter_data GROUP BY {columns}').fetchall()
+    return HierarchyTree(rows)
+
+
+def hierarchy_version():
+    """Data version of the last write that could move the tree (migration v11)"""
+    return reader().execute("SELECT hierarchy_version FROM data_version").fetchone()[0]
+
+
+def hierarchy():
+    """The hierarchy tree, rebuilt only after meters are added, removed or
+    re-homed; mute reason edits keep it"""
+    return _build_tree(hierarchy_version())
+
+
+def filter_options(scope, key):
+    """Dropdown choices for one hierarchy level: "All" plus the values in scope"""
+    return ["All"] + hierarchy().options(scope, key)
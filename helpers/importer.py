@@ -0,0 +1,251 @@
+import datetime
+import pandas as pd
+from openpyxl import load_workbook
+from helpers.dates import is_date_reject, parse_dates
+from helpers.migrations import DATE_COLUMNS, HEADER_ROW, hash_columns, hash_sql, register_row_hash
+from helpers.db import writer
+from helpers.queries import METER_KEY
+from helpers.partitions import add_to_daily_load, finish_daily_load, load_attachment, start_daily_load
+
+REQUIRED_COLUMNS = {
+    "Reference_no", "Name", "Circle", "Division", "Sub-Division",
+    "Feeder", "Latitude", "Longitude", "mute_reason"
+}
+
+# Rows parsed and written per executemany() batch
+CHUNK_SIZE = 50_000
+
+def _xlsx_chunks(uploaded_file, chunk_size):
+    wb = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(c).strip() if c is not None else "" for c in next(rows, [])]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch, columns=header, dtype=object)
+                batch = []
+        if batch or not header:
+            yield pd.DataFrame(batch, columns=header, dtype=object)
+    finally:
+        wb.close()
+
+
+def read_chunks(uploaded_file, chunk_size=CHUNK_SIZE):
+    """Streams an uploaded CSV/XLSX as DataFrames of at most chunk_size rows"""
+    if uploaded_file.name.endswith('.csv'):
+        # Read everything as text; SQLite column affinity converts numbers.
+        # Only empty cells are missing - values like 'N/A' are real data.
+        return pd.read_csv(
+            uploaded_file, dtype=object, chunksize=chunk_size,
+            keep_default_na=False, na_values=['']
+        )
+    return _xlsx_chunks(uploaded_file, chunk_size)
+
+
+def clean_reference(value):
+    # Excel hands back whole numbers as int or float; keep the digits only
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def clean_chunk(chunk):
+    """Normalises one parsed chunk into insertable values (None for blanks).
+
+    Returns the chunk and the (Reference_no, column, raw value) of every
+    date that could not be read, as the v2 migration records them.
+    """
+    chunk = chunk.dropna(subset=['Reference_no']).copy()
+    chunk['Reference_no'] = chunk['Reference_no'].map(clean_reference)
+    chunk = chunk[chunk['Reference_no'] != '']
+    rejects = []
+    for col in DATE_COLUMNS:
+        if col in chunk.columns:
+            # Each value is parsed on its own, day first; a file may mix layouts
+            values = chunk[col].tolist()
+            iso = parse_dates(values)
+            rejects.extend(
+                (ref, col, str(value))
+                for ref, value, day in zip(chunk['Reference_no'], values, iso)
+                if is_date_reject(value, day)
+            )
+            chunk[col] = pd.Series(iso, index=chunk.index, dtype=object)
+    return chunk.astype(object).where(chunk.notna(), None), rejects
+
+
+IMPORT_MODES = {
+    'append': "Append new records only",
+    'merge': "Merge: also update changed records",
+    'snapshot': "Daily snapshot: merge, and keep this file as the dated load for comparison",
+}
+
+
+class _ImportPlan:
+    """SQL for one upload, built once the file's header is known"""
+
+    def __init__(self, conn, columns):
+        table = conn.execute("PRAGMA table_info(meter_data)").fetchall()
+        self.columns = columns
+        names = ", ".join(f'"{c}"' for c in columns)
+
+        # Staging table with the same declared types, so incoming values get
+        # the same affinity (and therefore the same hash) as stored ones
+        definitions = ", ".join(f'"{name}" {col_type}' for _, name, col_type, _, _, _ in table)
+        conn.execute("DROP TABLE IF EXISTS temp.import_stage")
+        conn.execute(f"CREATE TEMP TABLE import_stage ({definitions}, _exists INTEGER, _hash TEXT, _changed INTEGER)")
+        conn.execute("DROP TABLE IF EXISTS temp.import_rejects")
+        conn.execute("CREATE TEMP TABLE import_rejects (Reference_no TEXT, column_name TEXT, raw_value TEXT)")
+        self.stage_rejects = "INSERT INTO import_rejects VALUES (?, ?, ?)"
+        self.stage = f"INSERT INTO import_stage ({names}) VALUES ({', '.join('?' for _ in columns)})"
+        self.mark_existing = """
+            UPDATE import_stage SET _exists = EXISTS (
+                SELECT 1 FROM meter_data m WHERE m.Reference_no = import_stage.Reference_no
+            )
+        """
+
+        # A date the file leaves blank or unreadable never replaces a stored
+        # one; the unreadable text goes to date_rejects instead
+        def merged_value(c, staged, stored):
+            if c in DATE_COLUMNS:
+                return f'IFNULL({staged}."{c}", {stored}."{c}")'
+            return f'{staged}."{c}"'
+
+        # Hash of each staged row as it will be stored: new rows hash their
+        # staged values; existing rows hash the merged row (columns missing
+        # from the file keep their stored values)
+        self.hash_new = f"""
+            UPDATE import_stage SET _hash = {hash_sql(f'"{c}"' for c in hash_columns(conn))}
+            WHERE NOT _exists
+        """
+        merged = hash_sql(
+            merged_value(c, 'import_stage', 'm') if c in columns else f'm."{c}"'
+            for c in hash_columns(conn)
+        )
+        self.hash_existing = f"""
+            UPDATE import_stage SET _hash = (
+                SELECT {merged} FROM meter_data m WHERE m.Reference_no = import_stage.Reference_no
+            )
+            WHERE _exists
+        """
+        self.mark_changed = """
+            UPDATE import_stage SET _changed = _hash IS NOT (
+                SELECT row_hash FROM meter_hashes h WHERE h.Reference_no = import_stage.Reference_no
+            )
+            WHERE _exists
+        """
+        self.insert = (f"INSERT INTO meter_data ({names}) SELECT {names} FROM import_stage "
+                       "WHERE NOT _exists ON CONFLICT(Reference_no) DO NOTHING")
+
+        # Merge never overwrites field-entered mute reasons
+        updatable = [c for c in columns if c not in ('Reference_no', 'mute_reason')]
+        self.update = None
+        if updatable:
+            assignments = ", ".join(f'"{c}" = {merged_value(c, "s", "meter_data")}' for c in updatable)
+            self.update = f"""
+                UPDATE meter_data SET {assignments}
+                FROM import_stage s
+                WHERE meter_data.Reference_no = s.Reference_no AND s._changed
+            """
+
+        # Later duplicates of a reference in the same file are not inserted,
+        # so the first staged row's hash has to be the one that sticks
+        self.store_hashes = """
+            INSERT INTO meter_hashes (Reference_no, row_hash)
+            SELECT Reference_no, _hash FROM import_stage
+            WHERE NOT _exists OR _changed
+            ORDER BY rowid DESC
+            ON CONFLICT(Reference_no) DO UPDATE SET row_hash = excluded.row_hash
+        """
+
+        # Rows this batch inserts, or compares in a merge (_changed is only
+        # set there), drop their old rejects for the uploaded date columns
+        # and record the new ones
+        written = """
+            SELECT Reference_no FROM import_stage WHERE NOT _exists OR _changed IS NOT NULL
+        """
+        uploaded_dates = ", ".join(f"'{c}'" for c in columns if c in DATE_COLUMNS)
+        self.clear_rejects = None
+        if uploaded_dates:
+            self.clear_rejects = f"""
+                DELETE FROM date_rejects
+                WHERE column_name IN ({uploaded_dates}) AND Reference_no IN ({written})
+            """
+        self.store_rejects = f"""
+            INSERT INTO date_rejects ({METER_KEY}, Reference_no, column_name, raw_value)
+            SELECT m.{METER_KEY}, r.Reference_no, r.column_name, r.raw_value
+            FROM import_rejects r JOIN meter_data m ON m.Reference_no = r.Reference_no
+            WHERE r.Reference_no IN ({written})
+        """
+
+
+def import_meter_data(uploaded_file, mode='append', progress=None, snapshot_day=None):
+    """Loads an upload into meter_data in one transaction.
+
+    'append' inserts rows whose Reference_no is new and skips the rest.
+    'merge' additionally rewrites existing rows whose feed columns changed
+    (detected through meter_hashes), leaving mute_reason untouched.
+    'snapshot' merges and, in the same transaction, stores the uploaded
+    rows with their own mute reasons as the daily load for snapshot_day
+    (default today) in its monthly partition; see helpers.partitions.
+
+    Returns a dict with 'rows', 'inserted', 'updated', 'unchanged',
+    'skipped' and 'ignored_columns'. Raises ValueError when required columns
+    are missing. progress(rows_read) is called after every batch.
+    """
+    stats = {'rows': 0, 'inserted': 0, 'updated': 0, 'ignored_columns': []}
+    merge = mode in ('merge', 'snapshot')
+    snapshot = mode == 'snapshot'
+    if snapshot:
+        snapshot_day = snapshot_day or datetime.date.today()
+    plan = None
+    with writer(attach=load_attachment(snapshot_day) if snapshot else None) as conn:
+        register_row_hash(conn)
+        if snapshot:
+            start_daily_load(conn, snapshot_day)
+        # meter_id is assigned by SQLite; a column of that name in a file is ignored
+        table_columns = [row[1] for row in conn.execute("PRAGMA table_info(meter_data)") if row[1] != METER_KEY]
+
+        for chunk in read_chunks(uploaded_file):
+            chunk.columns = [str(c).strip() for c in chunk.columns]
+            if plan is None:
+                missing = REQUIRED_COLUMNS - set(chunk.columns)
+                if missing:
+                    raise ValueError(f"Missing required columns: {', '.join(sorted(missing))}")
+                stats['ignored_columns'] = [c for c in chunk.columns if c not in table_columns]
+                plan = _ImportPlan(conn, [c for c in chunk.columns if c in table_columns])
+
+            stats['rows'] += len(chunk)
+            chunk, rejects = clean_chunk(chunk[plan.columns])
+            conn.execute("DELETE FROM import_stage")
+            conn.execute("DELETE FROM import_rejects")
+            conn.executemany(plan.stage, chunk.itertuples(index=False, name=None))
+            conn.executemany(plan.stage_rejects, rejects)
+            # A header line repeated among the data is not a meter
+            conn.execute(f"DELETE FROM import_stage WHERE {HEADER_ROW}")
+            conn.execute(plan.mark_existing)
+            conn.execute(plan.hash_new)
+            if merge:
+                conn.execute(plan.hash_existing)
+                conn.execute(plan.mark_changed)
+            stats['inserted'] += conn.execute(plan.insert).rowcount
+            if merge and plan.update:
+                stats['updated'] += conn.execute(plan.update).rowcount
+            conn.execute(plan.store_hashes)
+            if plan.clear_rejects:
+                conn.execute(plan.clear_rejects)
+            conn.execute(plan.store_rejects)
+            if snapshot:
+                add_to_daily_load(conn, snapshot_day, "temp.import_stage")
+            if progress:
+                progress(stats['rows'])
+        if snapshot:
+            stats['snapshot_rows'] = finish_daily_load(conn, snapshot_day)
+        if plan is not None:
+            conn.execute("DROP TABLE temp.import_stage")
+            conn.execute("DROP TABLE temp.import_rejects")
+
+    stats['unchanged'] = stats['rows'] - stats['inserted'] - stats['updated']
+    stats['skipped'] = stats['unchanged'] if merge else stats['rows'] - stats['inserted']
+    return stats
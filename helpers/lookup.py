@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+import pandas as pd
+import streamlit as st
+from helpers.db import reader
+from helpers.queries import scope_condition, scope_key
+from helpers.store import data_version
+
+# Recent (reference, access scope) lookups kept per process
+LOOKUP_CACHE_SIZE = 4096
+
+
+class RecordCache:
+    """LRU of single-meter lookups for Customer Search.
+
+    A lookup is one indexed query that returns the record together with
+    whether it lies inside the caller's access scope. Entries are evicted
+    when the meter_changes log shows their record changed.
+    """
+
+    def __init__(self, size=LOOKUP_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+
+    def _sync(self, version):
+        # Caller holds the lock
+        if self._version is not None and version != self._version:
+            count, oldest = reader().execute(
+                "SELECT COUNT(*), MIN(version) FROM meter_changes WHERE version > ?", (self._version,)
+            ).fetchone()
+            if count == 0 or oldest != self._version + 1 or count > self.size:
+                self._entries.clear()
+            else:
+                changed = {ref for (ref,) in reader().execute(
+                    "SELECT Reference_no FROM meter_changes WHERE version > ?", (self._version,)
+                )}
+                for key in [key for key in self._entries if key[0] in changed]:
+                    del self._entries[key]
+        self._version = version
+
+    def lookup(self, ref_no, scope):
+        """(exists, record) for a reference number.
+
+        record is a one-row DataFrame, or None when the meter does not exist
+        or lies outside scope.
+        """
+        key = (ref_no, scope_key(scope))
+        with self._lock:
+            self._sync(data_version())
+            version = self._version
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            condition, params = scope_condition(scope)
+            cursor = reader().execute(
+                f"SELECT ({condition}) AS _visible, * FROM meter_data WHERE Reference_no = ?",
+                params + [ref_no]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                entry = (False, None)
+            elif not row[0]:
+                entry = (True, None)
+            else:
+                columns = [d[0] for d in cursor.description[1:]]
+                entry = (True, pd.DataFrame([row[1:]], columns=columns))
+            with self._lock:
+                # A record read while another thread synced may be stale
+                if self._version == version:
+                    self._entries[key] = entry
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+
+        exists, record = entry
+        # Callers edit the record they get back (e.g. after a submit)
+        return exists, None if record is None else record.copy()
+
+
+@st.cache_resource
+def get_record_cache():
+    return RecordCache()
+
+
+def lookup_record(ref_no, scope):
+    """Cached Customer Search lookup; see RecordCache.lookup()"""
+    return get_record_cache().lookup(ref_no, scope)
@@ -0,0 +1,585 @@
+import hashlib
+import streamlit as st
+from helpers.dates import is_date_reject, parse_dates
+from helpers.db import PUBLISH_VERSION, connect
+from helpers.queries import METER_KEY
+
+# Schema migrations for sepco_meters.db. The applied level is kept in
+# PRAGMA user_version; each step runs once, inside its own transaction.
+# Never edit a released step - append a new one instead.
+
+DATE_COLUMNS = ['Connection Date', 'First Installation Date', 'Installation Date']
+
+# Columns left out of row hashes: field-entered data and the internal key,
+# not part of the AMR feed
+HASH_EXCLUDE = {'mute_reason', METER_KEY}
+
+
+def row_hash(text):
+    """SQL function row_hash(): digest of a row serialised by hash_sql()"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def register_row_hash(conn):
+    conn.create_function("row_hash", 1, row_hash, deterministic=True)
+
+
+def hash_columns(conn):
+    return [
+        name for _, name, _, _, _, _ in conn.execute("PRAGMA table_info(meter_data)")
+        if name not in HASH_EXCLUDE
+    ]
+
+
+def hash_sql(expressions):
+    """SQL expression hashing the given column expressions.
+
+    Values are serialised with json_array() inside SQLite, after column
+    affinity, so stored rows and freshly staged rows hash alike. '' and NULL
+    are treated the same, since files cannot tell them apart.
+    """
+    values = ", ".join(f"NULLIF({e}, '')" for e in expressions)
+    return f"row_hash(json_array({values}))"
+
+
+def _v1_indexes(conn):
+    # Older imports could leave repeated reference numbers; keep the first row.
+    # Rows without a reference are not duplicates of each other (the unique
+    # index allows any number of NULLs), so they are left alone.
+    conn.execute("""
+        DELETE FROM meter_data
+        WHERE Reference_no IS NOT NULL
+          AND rowid NOT IN (
+              SELECT MIN(rowid) FROM meter_data
+              WHERE Reference_no IS NOT NULL
+              GROUP BY Reference_no
+          )
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_meter_reference ON meter_data (Reference_no)")
+    # One composite index per hierarchy suffix so a user restricted at any
+    # level (e.g. division only) still gets an index seek
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_meter_circle ON meter_data (Circle, Division, "Sub-Division", Feeder)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_meter_division ON meter_data (Division, "Sub-Division", Feeder)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_meter_subdivision ON meter_data ("Sub-Division", Feeder)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_meter_feeder ON meter_data (Feeder)')
+
+
+def _rebuild_meter_data(conn, column_types, key=None):
+    """Recreates meter_data with new declared types, keeping rowids, indexes
+    and triggers. key, if given, is added as an INTEGER PRIMARY KEY column
+    holding the existing rowids."""
+    columns = conn.execute("PRAGMA table_info(meter_data)").fetchall()
+    schema = [sql for (sql,) in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = 'meter_data' "
+        "AND sql IS NOT NULL ORDER BY type = 'trigger'"
+    )]
+    definitions = ", ".join(
+        f'"{name}" {column_types.get(name, col_type)}'
+        for _, name, col_type, _, _, _ in columns
+    )
+    names = ", ".join(f'"{name}"' for _, name, _, _, _, _ in columns)
+    if key:
+        definitions += f', "{key}" INTEGER PRIMARY KEY'
+
+    conn.execute(f"CREATE TABLE meter_data_new ({definitions})")
+    conn.execute(f"INSERT INTO meter_data_new (rowid, {names}) SELECT rowid, {names} FROM meter_data")
+    conn.execute("DROP TABLE meter_data")
+    conn.execute("ALTER TABLE meter_data_new RENAME TO meter_data")
+    for sql in schema:
+        conn.execute(sql)
+
+
+def _v2_typed_columns(conn):
+    column_types = {'Latitude': 'REAL', 'Longitude': 'REAL'}
+    column_types.update({col: 'TEXT' for col in DATE_COLUMNS})
+    _rebuild_meter_data(conn, column_types)
+
+    # Coordinates: strip whitespace and the literal backslash-n the AMR export
+    # prefixes to some values; anything else that is not a number becomes NULL
+    for col in ['Latitude', 'Longitude']:
+        clean = f"""TRIM(REPLACE("{col}", '\\n', ''), char(32, 9, 10, 13))"""
+        conn.execute(f"""
+            UPDATE meter_data SET "{col}" = CASE
+                WHEN {clean} = '' OR {clean} GLOB '*[^0-9.+-]*' THEN NULL
+                ELSE CAST({clean} AS REAL)
+            END
+            WHERE typeof("{col}") != 'real'
+        """)
+
+    # Dates: free text -> ISO 8601 (YYYY-MM-DD, see helpers.dates). Text that does not parse
+    # becomes NULL in meter_data; the original is kept in date_rejects so
+    # nothing is lost and the rows can be corrected by hand.
+    conn.execute("""
+        CREATE TABLE date_rejects (
+            meter_rowid INTEGER NOT NULL,
+            Reference_no TEXT,
+            column_name TEXT NOT NULL,
+            raw_value TEXT NOT NULL
+        )
+    """)
+    for col in DATE_COLUMNS:
+        rows = conn.execute(
+            f'SELECT rowid, Reference_no, "{col}" FROM meter_data WHERE "{col}" IS NOT NULL'
+        ).fetchall()
+        if not rows:
+            continue
+        rowids, refs, values = zip(*rows)
+        # Each value is parsed on its own, day first; a column may mix layouts
+        iso = parse_dates(values)
+        conn.executemany(
+            "INSERT INTO date_rejects VALUES (?, ?, ?, ?)",
+            [
+                (rowid, ref, col, str(value))
+                for rowid, ref, value, day in zip(rowids, refs, values, iso)
+                if is_date_reject(value, day)
+            ]
+        )
+        conn.executemany(f'UPDATE meter_data SET "{col}" = ? WHERE rowid = ?', zip(iso, rowids))
+
+
+def _v3_mute_summary(conn):
+    # Rollup of mute meters per hierarchy node and reason. Blank hierarchy
+    # values are stored as '' so they take part in the primary key.
+    conn.execute("""
+        CREATE TABLE mute_summary (
+            "Circle" TEXT NOT NULL,
+            "Division" TEXT NOT NULL,
+            "Sub-Division" TEXT NOT NULL,
+            "Feeder" TEXT NOT NULL,
+            "mute_reason" TEXT NOT NULL,
+            "count" INTEGER NOT NULL,
+            PRIMARY KEY ("Circle", "Division", "Sub-Division", "Feeder", "mute_reason")
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO mute_summary
+        SELECT IFNULL(Circle, ''), IFNULL(Division, ''), IFNULL("Sub-Division", ''),
+               IFNULL(Feeder, ''), TRIM(mute_reason), COUNT(*)
+        FROM meter_data
+        WHERE TRIM(IFNULL(mute_reason, '')) != ''
+        GROUP BY 1, 2, 3, 4, 5
+    """)
+
+    # Triggers keep the rollup in step with every write path
+    add = """
+        INSERT INTO mute_summary
+        SELECT IFNULL(NEW.Circle, ''), IFNULL(NEW.Division, ''), IFNULL(NEW."Sub-Division", ''),
+               IFNULL(NEW.Feeder, ''), TRIM(NEW.mute_reason), 1
+        WHERE TRIM(IFNULL(NEW.mute_reason, '')) != ''
+        ON CONFLICT DO UPDATE SET "count" = "count" + 1;
+    """
+    old_key = """
+        "Circle" = IFNULL(OLD.Circle, '') AND "Division" = IFNULL(OLD.Division, '')
+        AND "Sub-Division" = IFNULL(OLD."Sub-Division", '') AND "Feeder" = IFNULL(OLD.Feeder, '')
+        AND "mute_reason" = TRIM(OLD.mute_reason)
+    """
+    remove = f"""
+        UPDATE mute_summary SET "count" = "count" - 1
+        WHERE TRIM(IFNULL(OLD.mute_reason, '')) != '' AND {old_key};
+        DELETE FROM mute_summary WHERE "count" <= 0 AND {old_key};
+    """
+    conn.execute(f"CREATE TRIGGER trg_mute_summary_insert AFTER INSERT ON meter_data BEGIN {add} END")
+    conn.execute(f"CREATE TRIGGER trg_mute_summary_delete AFTER DELETE ON meter_data BEGIN {remove} END")
+    conn.execute(f"""
+        CREATE TRIGGER trg_mute_summary_update
+        AFTER UPDATE OF mute_reason, Circle, Division, "Sub-Division", Feeder ON meter_data
+        BEGIN {remove} {add} END
+    """)
+
+
+def _v4_row_hashes(conn):
+    # Hash of every row's feed columns, used by the import merge mode
+    conn.execute("""
+        CREATE TABLE meter_hashes (
+            Reference_no TEXT PRIMARY KEY,
+            row_hash TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    register_row_hash(conn)
+    digest = hash_sql(f'"{c}"' for c in hash_columns(conn))
+    conn.execute(f"""
+        INSERT INTO meter_hashes
+        SELECT Reference_no, {digest} FROM meter_data WHERE Reference_no IS NOT NULL
+    """)
+    conn.execute("""
+        CREATE TRIGGER trg_meter_hashes_delete AFTER DELETE ON meter_data
+        BEGIN DELETE FROM meter_hashes WHERE Reference_no = OLD.Reference_no; END
+    """)
+
+
+def _v5_spatial_index(conn):
+    # R*Tree over meter coordinates, keyed by meter_data rowid. Points are
+    # stored as zero-size boxes; rows without valid coordinates are left out.
+    conn.execute("CREATE VIRTUAL TABLE meter_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+    valid = """
+        {row}.Latitude BETWEEN -90 AND 90 AND {row}.Longitude BETWEEN -180 AND 180
+    """
+    conn.execute(f"""
+        INSERT INTO meter_rtree
+        SELECT rowid, Latitude, Latitude, Longitude, Longitude FROM meter_data
+        WHERE {valid.format(row='meter_data')}
+    """)
+    _create_rtree_triggers(conn, 'rowid')
+
+
+def _create_rtree_triggers(conn, key):
+    valid = """
+        NEW.Latitude BETWEEN -90 AND 90 AND NEW.Longitude BETWEEN -180 AND 180
+    """
+    add = f"""
+        INSERT INTO meter_rtree
+        SELECT NEW.{key}, NEW.Latitude, NEW.Latitude, NEW.Longitude, NEW.Longitude
+        WHERE {valid};
+    """
+    remove = f"DELETE FROM meter_rtree WHERE id = OLD.{key};"
+    conn.execute(f"CREATE TRIGGER trg_meter_rtree_insert AFTER INSERT ON meter_data BEGIN {add} END")
+    conn.execute(f"CREATE TRIGGER trg_meter_rtree_delete AFTER DELETE ON meter_data BEGIN {remove} END")
+    conn.execute(f"""
+        CREATE TRIGGER trg_meter_rtree_update AFTER UPDATE OF Latitude, Longitude ON meter_data
+        BEGIN {remove} {add} END
+    """)
+
+
+def _v6_data_version(conn):
+    # Counter bumped by every write to meter_data, whatever the write path;
+    # caches key on it, so unchanged data stays cached indefinitely
+    conn.execute("""
+        CREATE TABLE data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT INTO data_version VALUES (1, 1)")
+    bump = "UPDATE data_version SET version = version + 1 WHERE id = 1;"
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f"""
+            CREATE TRIGGER trg_data_version_{event.lower()} AFTER {event} ON meter_data
+            BEGIN {bump} END
+        """)
+
+
+# Change log entries kept; caches further behind reload from scratch
+CHANGE_LOG_VERSIONS = 100_000
+
+
+def _v7_change_log(conn):
+    # Reference numbers touched by each data version, so cached frames can
+    # re-read just those rows. Replaces the v6 triggers: the bump and the
+    # log entry must happen in one trigger to share the new version.
+    conn.execute("CREATE TABLE meter_changes (version INTEGER NOT NULL, Reference_no TEXT)")
+    conn.execute("CREATE INDEX idx_meter_changes_version ON meter_changes (version)")
+
+    bump = "UPDATE data_version SET version = version + 1 WHERE id = 1;"
+    log = "INSERT INTO meter_changes SELECT version, {ref} FROM data_version WHERE id = 1{condition};"
+    bodies = {
+        'insert': bump + log.format(ref="NEW.Reference_no", condition=""),
+        'delete': bump + log.format(ref="OLD.Reference_no", condition=""),
+        'update': bump + log.format(ref="OLD.Reference_no", condition="")
+                  + log.format(ref="NEW.Reference_no", condition=" AND NEW.Reference_no IS NOT OLD.Reference_no"),
+    }
+    for event, body in bodies.items():
+        conn.execute(f"DROP TRIGGER trg_data_version_{event}")
+        conn.execute(f"""
+            CREATE TRIGGER trg_data_version_{event} AFTER {event.upper()} ON meter_data
+            BEGIN {body} END
+        """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_meter_changes_prune AFTER INSERT ON meter_changes
+        WHEN NEW.version % 1000 = 0
+        BEGIN DELETE FROM meter_changes WHERE version <= NEW.version - {CHANGE_LOG_VERSIONS}; END
+    """)
+
+
+# Calendar day of an event as days since 1970-01-01, in server local time
+EVENT_DAY_SQL = "CAST(strftime('%s', 'now', 'localtime') AS INTEGER) / 86400"
+
+
+def _v8_mute_events(conn):
+    # Append-only history of mute status changes, written by triggers so
+    # every write path records them. A 'mute' event opens an episode;
+    # 'restore' (reason cleared) and 'remove' (meter deleted) close it and
+    # carry its length. Hierarchy is copied as of the event.
+    conn.execute("""
+        CREATE TABLE mute_events (
+            id INTEGER PRIMARY KEY,
+            Reference_no TEXT,
+            event_time INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            old_reason TEXT,
+            new_reason TEXT,
+            down_seconds INTEGER,
+            "Circle" TEXT NOT NULL,
+            "Division" TEXT NOT NULL,
+            "Sub-Division" TEXT NOT NULL,
+            "Feeder" TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_mute_events_reference ON mute_events (Reference_no, id)")
+    conn.execute("CREATE INDEX idx_mute_events_day ON mute_events (day)")
+
+    # Per day and feeder event counts; trend queries read this, never the log
+    conn.execute("""
+        CREATE TABLE mute_daily (
+            day INTEGER NOT NULL,
+            "Circle" TEXT NOT NULL,
+            "Division" TEXT NOT NULL,
+            "Sub-Division" TEXT NOT NULL,
+            "Feeder" TEXT NOT NULL,
+            muted INTEGER NOT NULL,
+            restored INTEGER NOT NULL,
+            removed INTEGER NOT NULL,
+            restore_seconds INTEGER NOT NULL,
+            PRIMARY KEY (day, "Circle", "Division", "Sub-Division", "Feeder")
+        ) WITHOUT ROWID
+    """)
+    conn.execute('CREATE INDEX idx_mute_daily_division ON mute_daily ("Division", "Sub-Division", day)')
+    conn.execute("""
+        CREATE TRIGGER trg_mute_daily AFTER INSERT ON mute_events
+        BEGIN
+            INSERT INTO mute_daily
+            SELECT NEW.day, NEW.Circle, NEW.Division, NEW."Sub-Division", NEW.Feeder,
+                   NEW.kind = 'mute', NEW.kind = 'restore', NEW.kind = 'remove',
+                   CASE WHEN NEW.kind = 'restore' THEN NEW.down_seconds ELSE 0 END
+            WHERE NEW.kind != 'change'
+            ON CONFLICT DO UPDATE SET
+                muted = muted + excluded.muted,
+                restored = restored + excluded.restored,
+                removed = removed + excluded.removed,
+                restore_seconds = restore_seconds + excluded.restore_seconds;
+        END
+    """)
+
+    mute = "TRIM(IFNULL({row}.mute_reason, '')) != ''"
+    now = "CAST(strftime('%s', 'now') AS INTEGER)"
+    episode_start = """
+        (SELECT event_time FROM mute_events
+         WHERE Reference_no = OLD.Reference_no AND kind = 'mute' ORDER BY id DESC LIMIT 1)
+    """
+    record = f"""
+        INSERT INTO mute_events (Reference_no, event_time, day, kind, old_reason, new_reason,
+                                 down_seconds, "Circle", "Division", "Sub-Division", "Feeder")
+        SELECT {{row}}.Reference_no, {now}, {EVENT_DAY_SQL}, {{kind}},
+               {{old}}, {{new}}, {{down}},
+               IFNULL({{row}}.Circle, ''), IFNULL({{row}}.Division, ''),
+               IFNULL({{row}}."Sub-Division", ''), IFNULL({{row}}.Feeder, '');
+    """
+    # Meters already mute start their episode now; earlier history is unknown
+    conn.execute(f"""
+        INSERT INTO mute_events (Reference_no, event_time, day, kind, new_reason,
+                                 "Circle", "Division", "Sub-Division", "Feeder")
+        SELECT Reference_no, {now}, {EVENT_DAY_SQL}, 'mute', TRIM(mute_reason),
+               IFNULL(Circle, ''), IFNULL(Division, ''), IFNULL("Sub-Division", ''), IFNULL(Feeder, '')
+        FROM meter_data
+        WHERE {mute.format(row='meter_data')}
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_mute_events_insert AFTER INSERT ON meter_data
+        WHEN {mute.format(row='NEW')}
+        BEGIN {record.format(row='NEW', kind="'mute'", old='NULL', new='TRIM(NEW.mute_reason)', down='NULL')} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_mute_events_delete AFTER DELETE ON meter_data
+        WHEN {mute.format(row='OLD')}
+        BEGIN {record.format(row='OLD', kind="'remove'", old='TRIM(OLD.mute_reason)', new='NULL',
+                             down=f'{now} - {episode_start}')} END
+    """)
+    kind = f"""
+        CASE WHEN NOT {mute.format(row='OLD')} THEN 'mute'
+             WHEN NOT {mute.format(row='NEW')} THEN 'restore'
+             ELSE 'change' END
+    """
+    update = record.format(
+        row='NEW', kind=kind,
+        old="NULLIF(TRIM(OLD.mute_reason), '')", new="NULLIF(TRIM(NEW.mute_reason), '')",
+        down=f"CASE WHEN {mute.format(row='NEW')} THEN NULL ELSE {now} - {episode_start} END"
+    )
+    conn.execute(f"""
+        CREATE TRIGGER trg_mute_events_update AFTER UPDATE OF mute_reason ON meter_data
+        WHEN TRIM(IFNULL(OLD.mute_reason, '')) IS NOT TRIM(IFNULL(NEW.mute_reason, ''))
+        BEGIN {update} END
+    """)
+
+
+def _v9_health_scores(conn):
+    # Output of the health scoring job (helpers/health.py): one row per
+    # transformer and per feeder, replaced wholesale on every run. Feeder
+    # rows have Transformer ''.
+    conn.execute("""
+        CREATE TABLE health_scores (
+            level TEXT NOT NULL,
+            "Circle" TEXT NOT NULL,
+            "Division" TEXT NOT NULL,
+            "Sub-Division" TEXT NOT NULL,
+            "Feeder" TEXT NOT NULL,
+            "Transformer" TEXT NOT NULL,
+            meters INTEGER NOT NULL,
+            mute INTEGER NOT NULL,
+            mute_ratio REAL NOT NULL,
+            sanctioned_kw REAL NOT NULL,
+            capacity_kva REAL,
+            load_ratio REAL,
+            top_reason TEXT,
+            reason_mix TEXT,
+            score REAL NOT NULL,
+            data_version INTEGER NOT NULL,
+            computed_at TEXT NOT NULL,
+            PRIMARY KEY (level, "Circle", "Division", "Sub-Division", "Feeder", "Transformer")
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX idx_health_scores_rank ON health_scores (level, score DESC)")
+
+
+# Data versions whose change log entries are kept; caches further behind
+# reload from scratch
+CHANGE_LOG_TRANSACTIONS = 1_000
+
+
+def _v10_transaction_versions(conn):
+    # The v7 triggers bumped data_version once per changed row, so a bulk
+    # import paid an extra UPDATE per row and burned one version per meter.
+    # Triggers now only log the change under the next version; writer()
+    # publishes it (see db.PUBLISH_VERSION) once per transaction. A write
+    # made outside writer() is published by the next writer() transaction.
+    log = "INSERT INTO meter_changes SELECT version + 1, {ref} FROM data_version WHERE id = 1{condition};"
+    bodies = {
+        'insert': log.format(ref="NEW.Reference_no", condition=""),
+        'delete': log.format(ref="OLD.Reference_no", condition=""),
+        'update': log.format(ref="OLD.Reference_no", condition="")
+                  + log.format(ref="NEW.Reference_no", condition=" AND NEW.Reference_no IS NOT OLD.Reference_no"),
+    }
+    for event, body in bodies.items():
+        conn.execute(f"DROP TRIGGER trg_data_version_{event}")
+        conn.execute(f"""
+            CREATE TRIGGER trg_meter_changes_{event} AFTER {event.upper()} ON meter_data
+            BEGIN {body} END
+        """)
+    # Pruned as versions are published rather than on every logged row
+    conn.execute("DROP TRIGGER trg_meter_changes_prune")
+    conn.execute(f"""
+        CREATE TRIGGER trg_meter_changes_prune AFTER UPDATE OF version ON data_version
+        WHEN NEW.version % 100 = 0
+        BEGIN DELETE FROM meter_changes WHERE version <= NEW.version - {CHANGE_LOG_TRANSACTIONS}; END
+    """)
+
+
+# Columns that decide where a meter sits in the filter hierarchy
+HIERARCHY_COLUMNS = ['Circle', 'Division', 'Sub-Division', 'Feeder']
+
+
+def _v11_hierarchy_version(conn):
+    # Second counter that only moves when a published version added,
+    # removed or re-homed a meter, so the hierarchy tree survives mute
+    # reason edits. Each log entry records whether it can move the tree.
+    conn.execute("ALTER TABLE data_version ADD COLUMN hierarchy_version INTEGER NOT NULL DEFAULT 0")
+    conn.execute("UPDATE data_version SET hierarchy_version = version")
+    conn.execute("ALTER TABLE meter_changes ADD COLUMN hierarchy INTEGER NOT NULL DEFAULT 1")
+    conn.execute("CREATE INDEX idx_meter_changes_hierarchy ON meter_changes (version) WHERE hierarchy")
+    _create_change_log_triggers(conn)
+
+
+def _create_change_log_triggers(conn):
+    moved = " OR ".join(f'NEW."{c}" IS NOT OLD."{c}"' for c in HIERARCHY_COLUMNS)
+    log = ("INSERT INTO meter_changes (version, Reference_no, hierarchy) "
+           "SELECT version + 1, {ref}, {hierarchy} FROM data_version WHERE id = 1{condition};")
+    bodies = {
+        'insert': log.format(ref="NEW.Reference_no", hierarchy="1", condition=""),
+        'delete': log.format(ref="OLD.Reference_no", hierarchy="1", condition=""),
+        'update': log.format(ref="OLD.Reference_no", hierarchy=f"({moved})", condition="")
+                  + log.format(ref="NEW.Reference_no", hierarchy=f"({moved})",
+                               condition=" AND NEW.Reference_no IS NOT OLD.Reference_no"),
+    }
+    for event, body in bodies.items():
+        conn.execute(f"DROP TRIGGER trg_meter_changes_{event}")
+        conn.execute(f"""
+            CREATE TRIGGER trg_meter_changes_{event} AFTER {event.upper()} ON meter_data
+            BEGIN {body} END
+        """)
+
+
+def _v12_meter_key(conn):
+    # meter_rtree and date_rejects point at meter_data rowids, which VACUUM
+    # may renumber while the table has no INTEGER PRIMARY KEY. meter_id is
+    # that key: it keeps the current rowids, so existing entries stay valid.
+    _rebuild_meter_data(conn, {}, key=METER_KEY)
+    for event in ('insert', 'delete', 'update'):
+        conn.execute(f"DROP TRIGGER trg_meter_rtree_{event}")
+    _create_rtree_triggers(conn, METER_KEY)
+    conn.execute(f"ALTER TABLE date_rejects RENAME COLUMN meter_rowid TO {METER_KEY}")
+
+
+# A copy of the AMR export's header line among the data: its values are
+# column names, never a real place
+HEADER_ROW = "Circle = 'Circle' AND Division = 'Division'"
+
+
+def _v13_drop_header_row(conn):
+    # The header line of the original export was imported as a meter and
+    # every reader had to skip it. It is deleted once here, and the
+    # importer drops such lines as they arrive.
+    conn.execute(f"""
+        DELETE FROM date_rejects
+        WHERE {METER_KEY} IN (SELECT {METER_KEY} FROM meter_data WHERE {HEADER_ROW})
+    """)
+    conn.execute(f"DELETE FROM meter_data WHERE {HEADER_ROW}")
+    # "Sr. No." only told the hierarchy to skip that row
+    _create_change_log_triggers(conn)
+    conn.execute(PUBLISH_VERSION)
+
+
+def _v14_database_id(conn):
+    # Random identity of this database, kept next to its data version.
+    # Versions restart for every database, so files derived from one (the
+    # Arrow snapshots) carry the id too and are never matched to another.
+    conn.execute("ALTER TABLE data_version ADD COLUMN database_id TEXT NOT NULL DEFAULT ''")
+    conn.execute("UPDATE data_version SET database_id = lower(hex(randomblob(16)))")
+
+
+MIGRATIONS = [
+    (1, _v1_indexes),
+    (2, _v2_typed_columns),
+    (3, _v3_mute_summary),
+    (4, _v4_row_hashes),
+    (5, _v5_spatial_index),
+    (6, _v6_data_version),
+    (7, _v7_change_log),
+    (8, _v8_mute_events),
+    (9, _v9_health_scores),
+    (10, _v10_transaction_versions),
+    (11, _v11_hierarchy_version),
+    (12, _v12_meter_key),
+    (13, _v13_drop_header_row),
+    (14, _v14_database_id),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn):
+    """Applies pending migrations; conn must be in autocommit mode"""
+    for version, step in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock in case another process got here first
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            if current >= version:
+                conn.execute("ROLLBACK")
+                continue
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+@st.cache_resource
+def ensure_schema(db_path):
+    """Brings the database up to SCHEMA_VERSION once per server process"""
+    conn = connect(db_path, isolation_level=None)
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            migrate(conn)
+    finally:
+        conn.close()
+    return SCHEMA_VERSION
@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import streamlit as st
+from helpers.db import writer
+from helpers.queries import BLANK_CONDITION
+
+# How long the writer waits after the first queued submission so others
+# arriving in the same window share its transaction (seconds)
+FLUSH_INTERVAL = 0.05
+MAX_BATCH = 500
+
+# Seconds a page waits for its submission to be committed
+SUBMIT_TIMEOUT = 30
+
+# A reason can only be set once from the field; the admin tools are the
+# only places that overwrite one
+SET_IF_BLANK = f"""
+    UPDATE meter_data SET mute_reason = ?
+    WHERE Reference_no = ? AND {BLANK_CONDITION}
+"""
+
+
+class MuteReasonQueue:
+    """Write-behind queue for field mute reason submissions.
+
+    Submissions are collected for FLUSH_INTERVAL and committed together in
+    one transaction, so a morning sweep pays one fsync per batch instead of
+    one per click. Each submission gets a Future that resolves only after
+    the batch is committed.
+    """
+
+    def __init__(self):
+        self._pending = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="mute-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, ref_no, reason):
+        """Queues one update; the Future resolves to True if the reason was
+        set, False if the meter already had one (or does not exist)"""
+        future = Future()
+        self._pending.put((ref_no, reason, future))
+        return future
+
+    def _next_batch(self):
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        while len(batch) < MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _claim(batch):
+        # Submissions whose page stopped waiting were cancelled there and
+        # are dropped; the rest can no longer be cancelled
+        return [item for item in batch if item[2].set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            claimed = None
+            try:
+                with writer() as conn:
+                    # Claimed only once the write lock is held, so a page
+                    # that times out behind an import can still withdraw
+                    claimed = self._claim(batch)
+                    # Applied in arrival order: of two submissions for the
+                    # same meter, the first one wins
+                    applied = [
+                        conn.execute(SET_IF_BLANK, (reason, ref_no)).rowcount > 0
+                        for ref_no, reason, _ in claimed
+                    ]
+            except Exception as e:
+                for _, _, future in (self._claim(batch) if claimed is None else claimed):
+                    future.set_exception(e)
+                continue
+            for (_, _, future), ok in zip(claimed, applied):
+                future.set_result(ok)
+
+
+@st.cache_resource
+def get_mute_queue():
+    return MuteReasonQueue()
+
+
+def set_mute_reason(ref_no, reason):
+    """Sets a blank mute reason and waits until it is committed.
+
+    Returns False when the meter already has a reason. Raises TimeoutError
+    if the writer has not started on it within SUBMIT_TIMEOUT (e.g. behind
+    a long import); the submission is then withdrawn and nothing is written.
+    """
+    future = get_mute_queue().submit(ref_no, reason)
+    try:
+        return future.result(timeout=SUBMIT_TIMEOUT)
+    except TimeoutError:
+        if future.cancel():
+            raise
+        # Already claimed by a transaction that is committing
+        return future.result()
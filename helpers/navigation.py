@@ -55,7 +55,8 @@ def setup_navigation():
                 "Customer Search": "1_Customer_Search.py",
                 "Mute Analytics": "2_Mute_Analytics.py",
                 "Traffic Insights": "3_Traffic_Insights.py",
-                "Data Export": "4_Data_Export.py"
+                "Data Export": "4_Data_Export.py",
+                "Health Scores": "6_Health_Scores.py"
             }
             
             if st.session_state.user_role == "admin":
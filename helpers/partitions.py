@@ -0,0 +1,176 @@
+import datetime
+import glob
+import os
+from contextlib import closing
+import pandas as pd
+from helpers.db import connect
+from helpers.queries import MUTE_CONDITION, where_clause
+
+# Daily loads are kept outside sepco_meters.db, one SQLite file per month,
+# and attached only while a load is imported or compared. An import writes
+# its rows into the partition inside its own transaction.
+PARTITION_DIR = "daily_loads"
+
+# What a daily load keeps of each meter: enough to compare mute populations
+PARTITION_COLUMNS = ['Reference_no', 'Circle', 'Division', 'Sub-Division', 'Feeder', 'mute_reason']
+
+# Comparison sets: (older snapshot mute, newer snapshot state)
+DIFF_SETS = {
+    'newly_mute': "Newly Mute",
+    'restored': "Restored",
+    'still_mute': "Still Mute",
+    'dropped': "Dropped From Load",
+}
+
+
+def partition_path(day):
+    return os.path.join(PARTITION_DIR, f"meters-{day:%Y-%m}.db")
+
+
+def _create_tables(conn, schema):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.loads (
+            day TEXT PRIMARY KEY,
+            rows INTEGER NOT NULL,
+            mute INTEGER NOT NULL,
+            loaded_at TEXT NOT NULL
+        )
+    """)
+    # Clustered by day, so one day's load is a contiguous range; the partial
+    # index lists just the mute meters of a day
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.meters (
+            day TEXT NOT NULL,
+            Reference_no TEXT NOT NULL,
+            "Circle" TEXT,
+            "Division" TEXT,
+            "Sub-Division" TEXT,
+            "Feeder" TEXT,
+            mute_reason TEXT,
+            is_mute INTEGER NOT NULL,
+            PRIMARY KEY (day, Reference_no)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_meters_mute ON meters (day, Reference_no) WHERE is_mute")
+
+
+def load_attachment(day):
+    """writer() attach argument that opens day's partition as schema part"""
+    os.makedirs(PARTITION_DIR, exist_ok=True)
+    return {'part': partition_path(day)}
+
+
+def start_daily_load(conn, day):
+    """Clears an earlier load of day from the attached partition"""
+    _create_tables(conn, 'part')
+    conn.execute("DELETE FROM part.meters WHERE day = ?", (day.isoformat(),))
+
+
+def add_to_daily_load(conn, day, source):
+    """Copies the uploaded rows staged in source into day's load, each with
+    its own mute status. A reference repeated in the file keeps its first
+    row, as in meter_data."""
+    columns = ", ".join(f'"{c}"' for c in PARTITION_COLUMNS[:-1])
+    conn.execute(f"""
+        INSERT OR IGNORE INTO part.meters
+        SELECT ?, {columns}, NULLIF(TRIM(mute_reason), ''), {MUTE_CONDITION}
+        FROM {source}
+        WHERE Reference_no IS NOT NULL
+        ORDER BY rowid
+    """, (day.isoformat(),))
+
+
+def finish_daily_load(conn, day):
+    """Records day's totals in part.loads; returns the number of meters"""
+    rows, mute = conn.execute(
+        "SELECT COUNT(*), IFNULL(SUM(is_mute), 0) FROM part.meters WHERE day = ?", (day.isoformat(),)
+    ).fetchone()
+    conn.execute(
+        "INSERT OR REPLACE INTO part.loads VALUES (?, ?, ?, datetime('now'))",
+        (day.isoformat(), rows, mute)
+    )
+    return rows
+
+
+def snapshot_days():
+    """Captured loads, newest first: Date, Meters, Mute and Loaded At"""
+    loads = []
+    for path in sorted(glob.glob(os.path.join(PARTITION_DIR, "meters-*.db"))):
+        with closing(connect(path)) as conn:
+            _create_tables(conn, 'main')
+            loads.extend(conn.execute("SELECT day, rows, mute, loaded_at FROM loads").fetchall())
+    df = pd.DataFrame(loads, columns=['Date', 'Meters', 'Mute', 'Loaded At'])
+    df['Date'] = pd.to_datetime(df['Date']).dt.date
+    return df.sort_values('Date', ascending=False).reset_index(drop=True)
+
+
+# Sets found by walking the newer load's mute meters, and those found by
+# walking the older load's, with the test that places a meter in each
+NEWER_SETS = {'newly_mute': "NOT IFNULL(prev.is_mute, 0)", 'still_mute': "IFNULL(prev.is_mute, 0)"}
+OLDER_SETS = {'restored': "NOT IFNULL(cur.is_mute, 1)", 'dropped': "cur.Reference_no IS NULL"}
+
+
+def _diff_sql(newer_side, scope):
+    """FROM/WHERE over one day's mute meters (through the partial index),
+    each probing the other day by key. ?1 is the older day, ?2 the newer,
+    then the scope params, which apply to the walked day's hierarchy."""
+    if newer_side:
+        where, params = where_clause(scope, table='cur')
+        source = """
+            FROM cur.meters AS cur INDEXED BY idx_meters_mute
+            LEFT JOIN old.meters AS prev ON prev.day = ?1 AND prev.Reference_no = cur.Reference_no
+            WHERE cur.day = ?2 AND cur.is_mute
+        """
+    else:
+        where, params = where_clause(scope, table='prev')
+        source = """
+            FROM old.meters AS prev INDEXED BY idx_meters_mute
+            LEFT JOIN cur.meters AS cur ON cur.day = ?2 AND cur.Reference_no = prev.Reference_no
+            WHERE prev.day = ?1 AND prev.is_mute
+        """
+    if where:
+        source += " AND " + where[len(" WHERE "):]
+    return source, params
+
+
+def _open_pair(older, newer):
+    for day in (older, newer):
+        if not os.path.exists(partition_path(day)):
+            raise ValueError(f"No daily load captured for {day:%Y-%m-%d}")
+    conn = connect(":memory:")
+    conn.execute("ATTACH DATABASE ? AS old", (partition_path(older),))
+    conn.execute("ATTACH DATABASE ? AS cur", (partition_path(newer),))
+    return closing(conn)
+
+
+def diff_counts(older, newer, scope):
+    """Size of each DIFF_SETS set between two daily loads within scope.
+
+    Only the two days' mute meters are visited, one pass per day.
+    """
+    counts = {}
+    with _open_pair(older, newer) as conn:
+        for newer_side, sets in ((True, NEWER_SETS), (False, OLDER_SETS)):
+            source, params = _diff_sql(newer_side, scope)
+            totals = ", ".join(f"IFNULL(SUM({test}), 0)" for test in sets.values())
+            row = conn.execute(
+                f"SELECT {totals} " + source, [older.isoformat(), newer.isoformat()] + params
+            ).fetchone()
+            counts.update(zip(sets, row))
+    return {kind: counts[kind] for kind in DIFF_SETS}
+
+
+def diff_meters(older, newer, kind, scope):
+    """Meters in one DIFF_SETS set, with their reason on both days"""
+    newer_side = kind in NEWER_SETS
+    source, params = _diff_sql(newer_side, scope)
+    test = NEWER_SETS[kind] if newer_side else OLDER_SETS[kind]
+    base = 'cur' if newer_side else 'prev'
+    columns = ", ".join(f'{base}."{c}"' for c in PARTITION_COLUMNS[:-1])
+    with _open_pair(older, newer) as conn:
+        return pd.read_sql_query(
+            f'SELECT {columns}, prev.mute_reason AS "Reason Before", cur.mute_reason AS "Reason After" '
+            + source + f" AND {test} ORDER BY {base}.Reference_no",
+            conn,
+            params=[older.isoformat(), newer.isoformat()] + params
+        )
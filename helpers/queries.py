@@ -0,0 +1,75 @@
+import streamlit as st
+
+# Access/selection keys and the meter_data columns they restrict, top-down
+HIERARCHY = [
+    ('circle', 'Circle'),
+    ('division', 'Division'),
+    ('subdivision', 'Sub-Division'),
+    ('feeder', 'Feeder'),
+]
+
+# Internal, stable key of meter_data rows (migration v12); not part of the
+# AMR feed, so it is left out of exports and ignored in uploads
+METER_KEY = "meter_id"
+
+# The mute rule, shared with store.is_mute(): NULL reasons and reasons that
+# are blank after trimming are not mute
+MUTE_CONDITION = "TRIM(IFNULL(mute_reason, '')) != ''"
+
+# Meters without a reason; the field may only fill these in
+BLANK_CONDITION = f"NOT ({MUTE_CONDITION})"
+
+
+def access_scope():
+    """Access restrictions of the logged-in user ({} for admins)"""
+    if st.session_state.user_role == "admin":
+        return {}
+
+    # Safely check for access object
+    if not hasattr(st.session_state, 'access'):
+        st.error("Access permissions not properly initialized")
+        st.stop()
+
+    access = st.session_state.access
+    return {key: access[key] for key, _ in HIERARCHY if access.get(key)}
+
+
+def narrow_scope(scope, **selections):
+    """Adds sidebar selections to a scope; 'All' is ignored and access always wins"""
+    narrowed = dict(scope)
+    for key, _ in HIERARCHY:
+        value = selections.get(key)
+        if value and value != "All" and key not in scope:
+            narrowed[key] = value
+    return narrowed
+
+
+def scope_key(scope):
+    """Hashable form of a scope, used as cache key"""
+    return tuple(scope.get(key) for key, _ in HIERARCHY)
+
+
+def scope_condition(scope):
+    """Scope restrictions as one SQL expression ("1" when unrestricted): returns (sql, params)"""
+    where, params = where_clause(scope)
+    return (where[len(" WHERE "):] or "1"), params
+
+
+def where_clause(scope, extra=(), table=None):
+    """Parameterised WHERE for a scope: returns (sql, params).
+
+    extra holds additional (condition, param) pairs that are ANDed in;
+    table qualifies the hierarchy columns, for joins.
+    """
+    prefix = f"{table}." if table else ""
+    conditions, params = [], []
+    for key, column in HIERARCHY:
+        if scope.get(key):
+            conditions.append(f'{prefix}"{column}" = ?')
+            params.append(scope[key])
+    for condition, param in extra:
+        conditions.append(condition)
+        params.append(param)
+    if not conditions:
+        return "", []
+    return " WHERE " + " AND ".join(conditions), params
@@ -0,0 +1,57 @@
+import glob
+import os
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Arrow IPC copies of the typed meter_data frame, named by database id and
+# data version. Files are uncompressed so they can be memory-mapped on
+# start-up.
+SNAPSHOT_DIR = "snapshot_cache"
+
+# Bumped whenever prepare_frame() changes what it produces, so snapshots
+# written by older code are ignored (2: blank mute reasons kept as '')
+SNAPSHOT_FORMAT = 2
+SNAPSHOT_PREFIX = f"meter_data-f{SNAPSHOT_FORMAT}-"
+
+
+def snapshot_path(database_id, version):
+    return os.path.join(SNAPSHOT_DIR, f"{SNAPSHOT_PREFIX}{database_id}-{version}.arrow")
+
+
+def read_latest_snapshot(database_id, max_version):
+    """(version, typed frame) of the newest snapshot of this database not
+    past max_version, or None if there is none"""
+    prefix = f"{SNAPSHOT_PREFIX}{database_id}-"
+    versions = []
+    for path in glob.glob(os.path.join(SNAPSHOT_DIR, f"{prefix}*.arrow")):
+        version = os.path.basename(path)[len(prefix):-len(".arrow")]
+        if version.isdigit() and int(version) <= max_version:
+            versions.append(int(version))
+    if not versions:
+        return None
+    version = max(versions)
+    try:
+        table = feather.read_table(snapshot_path(database_id, version), memory_map=True)
+    except (OSError, pa.ArrowInvalid):
+        return None
+    # Dictionary columns come back as categoricals, downcast dtypes as-is
+    return version, table.to_pandas()
+
+
+def write_snapshot(df, database_id, version):
+    """Saves df as the snapshot for version and removes all others.
+
+    Snapshots are only an optimisation: failures are swallowed and the
+    next start simply reads SQLite again.
+    """
+    path = snapshot_path(database_id, version)
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        part = path + ".part"
+        feather.write_feather(df, part, compression='uncompressed')
+        os.replace(part, path)
+        for old in glob.glob(os.path.join(SNAPSHOT_DIR, "meter_data-*.arrow")):
+            if old != path:
+                os.remove(old)
+    except (OSError, pa.ArrowException):
+        pass
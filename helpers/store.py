@@ -0,0 +1,258 @@
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import streamlit as st
+from helpers.queries import HIERARCHY, scope_key, where_clause
+from helpers.migrations import ensure_schema
+from helpers.db import DB_PATH, reader
+from helpers.snapshot import read_latest_snapshot, write_snapshot
+
+NUMERIC_COLUMNS = ['Latitude', 'Longitude', 'Sanction Load', 'Transformer Capacity']
+DATE_COLUMNS = ['Installation Date']
+
+# Columns the pages read from cached frames; the rest of meter_data's 41
+# columns are only loaded when a caller asks for all of them
+FRAME_COLUMNS = [
+    'Sr. No.', 'Disco', 'Circle', 'Division', 'Sub-Division', 'Feeder', 'Transformer',
+    'Reference_no', 'Name', 'Sanction Load', 'Installation Date', 'Tariff',
+    'Latitude', 'Longitude', 'Meter Type', 'Manufacturer', 'Transformer Capacity', 'mute_reason',
+]
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORY_RATIO = 0.5
+
+# Kept at full precision; float32 would move meters by up to a metre
+COORDINATE_COLUMNS = ['Latitude', 'Longitude']
+
+# Number of restricted slices (access scope + selections) kept per process
+SCOPE_CACHE_SIZE = 32
+
+# Changed rows above which re-reading the table beats patching cached frames
+DELTA_LIMIT = 20_000
+
+# Changed rows the snapshot may fall behind the cached frame before a
+# rewrite (a data version can cover any number of rows)
+SNAPSHOT_LAG = 1_000
+
+
+def coerce_frame(df):
+    """Coerces numbers and dates (a guard against rows appended with text
+    values) and trims mute reasons"""
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    if 'mute_reason' in df.columns:
+        # Blank reasons are stored as '' (or whitespace); is_mute() ignores them
+        df['mute_reason'] = df['mute_reason'].str.strip()
+    return df
+
+
+def prepare_frame(df):
+    """Types a freshly read meter_data frame for compact, fast analytics.
+
+    On top of coerce_frame(), repetitive text columns become categoricals
+    and numeric codes are downcast to the smallest dtype.
+    """
+    df = coerce_frame(df)
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_integer_dtype(values):
+            df[col] = pd.to_numeric(values, downcast='integer')
+        elif pd.api.types.is_float_dtype(values):
+            if col not in COORDINATE_COLUMNS:
+                df[col] = pd.to_numeric(values, downcast='float')
+        elif pd.api.types.is_string_dtype(values) or values.dtype == object:
+            if values.nunique() <= CATEGORY_RATIO * len(values):
+                df[col] = values.astype('category')
+    return df
+
+
+def in_scope(df, scope):
+    """Rows of df inside scope"""
+    mask = pd.Series(True, index=df.index)
+    for key, column in HIERARCHY:
+        if scope.get(key):
+            mask &= df[column] == scope[key]
+    return df[mask]
+
+
+def apply_changes(df, refs, fresh, scope=None):
+    """df with the rows of refs replaced by their current state.
+
+    fresh holds the current rows for refs (coerced, not compacted); refs
+    missing from it were deleted. Rows that moved out of scope are dropped.
+    The dtypes of df, categoricals included, are kept.
+    """
+    kept = df[~df['Reference_no'].isin(refs)]
+    fresh = in_scope(fresh, scope or {})
+    columns = {}
+    for col in df.columns:
+        old, new = kept[col], fresh[col]
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            missing = pd.Index(new.dropna().unique()).difference(old.cat.categories)
+            if len(missing):
+                old = old.cat.add_categories(missing)
+            new = new.astype(old.dtype)
+        merged = pd.concat([old, new], ignore_index=True)
+        if pd.api.types.is_integer_dtype(merged) and merged.dtype != old.dtype:
+            merged = pd.to_numeric(merged, downcast='integer')
+        columns[col] = merged
+    return pd.DataFrame(columns)
+
+
+def data_version():
+    """Counter that grows with every committed write to meter_data (see
+    migrations v6 and v10)"""
+    return reader().execute("SELECT version FROM data_version").fetchone()[0]
+
+
+def database_id():
+    """Random identity of the database, fixed when it was migrated (v14)"""
+    return reader().execute("SELECT database_id FROM data_version").fetchone()[0]
+
+
+def is_mute(df):
+    """Boolean mask of rows that carry a mute reason.
+
+    The pandas form of queries.MUTE_CONDITION: NULL reasons and reasons
+    that are blank after trimming are not mute.
+    """
+    reason = df['mute_reason']
+    if isinstance(reason.dtype, pd.CategoricalDtype):
+        # Test each category once; code -1 (missing) picks the trailing False
+        mute = reason.cat.categories.astype(str).str.strip() != ''
+        flags = np.append(mute, False)[reason.cat.codes.to_numpy()]
+        return pd.Series(flags, index=df.index)
+    return reason.notna() & (reason.astype(str).str.strip() != '')
+
+
+class MeterStore:
+    """One typed copy of meter_data per server process, shared by all sessions.
+
+    Cached frames hold FRAME_COLUMNS, typed by prepare_frame(). The full
+    table is only loaded for unrestricted scopes; restricted scopes are read
+    with an indexed WHERE and kept in a small LRU. When data_version()
+    moves, only the rows listed in the meter_changes log since the cached
+    version are re-read and patched in. The unrestricted frame is also kept
+    as an Arrow snapshot, so a restart maps it and catches up the same way.
+    Pages get shallow copies; they may add or replace columns on their copy
+    but must never modify the shared values in place.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._df = None
+        self._scoped = OrderedDict()
+        self._version = None
+        self._snapshot_lag = 0
+        ensure_schema(DB_PATH)
+        self._database_id = database_id()
+
+    def _load(self, scope=None, all_columns=False):
+        where, params = where_clause(scope or {})
+        columns = "*" if all_columns else ", ".join(f'"{c}"' for c in FRAME_COLUMNS)
+        df = pd.read_sql_query(f"SELECT {columns} FROM meter_data" + where, reader(), params=params)
+        return prepare_frame(df)
+
+    def _changes_since(self, since):
+        """(refs, current rows) changed after version since, or None when
+        the log does not reach back that far or a reload is cheaper"""
+        conn = reader()
+        count, oldest = conn.execute(
+            "SELECT COUNT(*), MIN(version) FROM meter_changes WHERE version > ?", (since,)
+        ).fetchone()
+        if count == 0 or oldest != since + 1 or count > DELTA_LIMIT:
+            return None
+        refs = [ref for (ref,) in conn.execute(
+            "SELECT DISTINCT Reference_no FROM meter_changes WHERE version > ?", (since,)
+        )]
+        columns = ", ".join(f'"{c}"' for c in FRAME_COLUMNS)
+        fresh = pd.read_sql_query(
+            f"SELECT {columns} FROM meter_data WHERE Reference_no IN (SELECT value FROM json_each(?))",
+            conn,
+            params=[json.dumps(refs)]
+        )
+        return refs, coerce_frame(fresh)
+
+    def _sync(self, version):
+        # Caller holds the lock
+        if self._version is None:
+            snapshot = read_latest_snapshot(self._database_id, version)
+            if snapshot is not None:
+                self._version, self._df = snapshot
+                self._snapshot_lag = 0
+            else:
+                self._version = version
+        if version == self._version:
+            return
+
+        changes = self._changes_since(self._version)
+        if changes is None:
+            self._df = None
+            self._scoped.clear()
+        else:
+            refs, fresh = changes
+            if self._df is not None:
+                self._df = apply_changes(self._df, refs, fresh)
+                self._snapshot_lag += len(refs)
+                if self._snapshot_lag >= SNAPSHOT_LAG:
+                    write_snapshot(self._df, self._database_id, version)
+                    self._snapshot_lag = 0
+            for key, (scope, df) in list(self._scoped.items()):
+                self._scoped[key] = (scope, apply_changes(df, refs, fresh, scope))
+        self._version = version
+
+    def frame(self, scope=None, all_columns=False):
+        """Rows visible within scope (all rows when scope is empty).
+
+        all_columns=True reads every column of meter_data; those frames are
+        not cached, so use it only for one-off work such as downloads.
+        """
+        if all_columns:
+            return self._load(scope, all_columns=True)
+
+        scope = scope or {}
+        key = scope_key(scope)
+        with self._lock:
+            self._sync(data_version())
+            version = self._version
+            if not any(key):
+                if self._df is None:
+                    self._df = self._load()
+                    write_snapshot(self._df, self._database_id, version)
+                    self._snapshot_lag = 0
+                return self._df.copy(deep=False)
+
+            entry = self._scoped.get(key)
+            if entry is not None:
+                self._scoped.move_to_end(key)
+        if entry is not None:
+            return entry[1].copy(deep=False)
+
+        df = self._load(scope)
+        with self._lock:
+            # Skip caching if the data changed while this was loading
+            if self._version == version:
+                self._scoped[key] = (scope, df)
+                while len(self._scoped) > SCOPE_CACHE_SIZE:
+                    self._scoped.popitem(last=False)
+        return df.copy(deep=False)
+
+
+@st.cache_resource  # Frames are invalidated by data version, not by age
+def get_store():
+    return MeterStore()
+
+
+def load_data(scope=None, all_columns=False):
+    """Shared meter_data frame for a scope with the page-level error handling"""
+    try:
+        return get_store().frame(scope, all_columns)
+    except Exception as e:
+        st.error(f"Failed to load data: {str(e)}")
+        return pd.DataFrame()
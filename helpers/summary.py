@@ -0,0 +1,14 @@
+import pandas as pd
+from helpers.queries import where_clause
+from helpers.db import reader
+
+
+def mute_reason_counts(scope):
+    """Mute meters per reason within scope, read from the mute_summary rollup"""
+    where, params = where_clause(scope)
+    return pd.read_sql_query(
+        'SELECT mute_reason AS "Mute Reason", SUM("count") AS "Count" FROM mute_summary'
+        + where + ' GROUP BY mute_reason ORDER BY "Count" DESC',
+        reader(),
+        params=params
+    )
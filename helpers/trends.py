@@ -0,0 +1,110 @@
+import pandas as pd
+import streamlit as st
+from helpers.db import reader
+from helpers.migrations import EVENT_DAY_SQL
+from helpers.queries import where_clause
+from helpers.store import data_version
+
+# Trend bucket -> (SQL bucket of a day number, days per bucket, first day of bucket 0).
+# Weeks start on Monday; day 0 (1970-01-01) was a Thursday.
+FREQUENCIES = {
+    'day': ("day", 1, 0),
+    'week': ("(day + 3) / 7", 7, -3),
+}
+
+SECONDS_PER_HOUR = 3600
+
+
+def today():
+    """Current day number, as stored in mute_events.day"""
+    return reader().execute(f"SELECT {EVENT_DAY_SQL}").fetchone()[0]
+
+
+def _first_day(scope, days, day):
+    if days is not None:
+        return day - days + 1
+    where, params = where_clause(scope)
+    return reader().execute("SELECT MIN(day) FROM mute_daily" + where, params).fetchone()[0]
+
+
+# The cached readers take today's day number as an argument so that a
+# window ending today is recomputed when the day rolls over, even if no
+# write has moved the data version
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _trend(scope, freq, days, day, version):
+    start = _first_day(scope, days, day)
+    columns = ['Date', 'Muted', 'Restored', 'Removed', 'Backlog', 'MTTR (h)']
+    if start is None:
+        return pd.DataFrame(columns=columns)
+    bucket, width, offset = FREQUENCIES[freq]
+
+    # Meters still mute when the window opens
+    where, params = where_clause(scope, [("day < ?", start)])
+    backlog = reader().execute(
+        "SELECT IFNULL(SUM(muted - restored - removed), 0) FROM mute_daily" + where, params
+    ).fetchone()[0]
+
+    where, params = where_clause(scope, [("day >= ?", start)])
+    counts = pd.read_sql_query(
+        f"""
+        SELECT {bucket} AS bucket, SUM(muted) AS muted, SUM(restored) AS restored,
+               SUM(removed) AS removed, SUM(restore_seconds) AS restore_seconds
+        FROM mute_daily{where}
+        GROUP BY bucket
+        """,
+        reader(),
+        params=params,
+        index_col='bucket'
+    )
+
+    # Every bucket in the window, including those without events
+    first = (start - offset) // width
+    last = (day - offset) // width
+    counts = counts.reindex(range(first, last + 1), fill_value=0)
+    trend = pd.DataFrame({
+        'Date': pd.to_datetime(counts.index * width + offset, unit='D'),
+        'Muted': counts['muted'].to_numpy(),
+        'Restored': counts['restored'].to_numpy(),
+        'Removed': counts['removed'].to_numpy(),
+        'Backlog': backlog + (counts['muted'] - counts['restored'] - counts['removed']).cumsum().to_numpy(),
+        'MTTR (h)': (counts['restore_seconds'] / counts['restored'].where(counts['restored'] > 0)
+                     / SECONDS_PER_HOUR).to_numpy(),
+    })
+    return trend[columns]
+
+
+def mute_trend(scope, freq='day', days=90):
+    """Mute events per day or week within scope over the last days (all
+    history if None).
+
+    One row per bucket with meters newly muted, restored and removed, the
+    backlog (meters mute) at the end of the bucket and the mean time to
+    restore of that bucket's restorations. Read from the mute_daily
+    rollup and cached per data version.
+    """
+    return _trend(scope, freq, days, today(), data_version())
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _mttr(scope, column, days, day, version):
+    start = _first_day(scope, days, day)
+    where, params = where_clause(scope, [("day >= ?", start)])
+    return pd.read_sql_query(
+        f"""
+        SELECT "{column}", SUM(restored) AS "Restored",
+               SUM(restore_seconds) * 1.0 / SUM(restored) / {SECONDS_PER_HOUR} AS "MTTR (h)"
+        FROM mute_daily{where}
+        GROUP BY "{column}"
+        HAVING SUM(restored) > 0
+        ORDER BY "MTTR (h)" DESC
+        """,
+        reader(),
+        params=params
+    )
+
+
+def mttr_by(scope, column='Sub-Division', days=90):
+    """Restorations and mean time to restore (hours) per value of a
+    hierarchy column within scope, worst first"""
+    return _mttr(scope, column, days, today(), data_version())
@@ -1,9 +1,10 @@
 import streamlit as st
-import sqlite3
 import bcrypt
 import os
 from PIL import Image
 from helpers.auth import hash_password, verify_password
+from helpers.migrations import ensure_schema
+from helpers.db import DB_PATH, reader
 
 # Initialize session state
 if 'logged_in' not in st.session_state:
@@ -54,13 +55,13 @@ def authenticate(email, password, role):
         st.error("Email must be a valid SEPCO email (e.g., user@sepco.com.pk).")
         return False
 
-    db_file = "sepco_meters.db"
-    if not os.path.exists(db_file):
+    if not os.path.exists(DB_PATH):
         st.error("Database file not found. Please contact the administrator.")
         return False
 
     try:
-        with sqlite3.connect(db_file) as conn:
+        ensure_schema(DB_PATH)
+        with reader() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """SELECT email, password, role, circle, division, subdivision, feeder 
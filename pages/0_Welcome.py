@@ -94,6 +94,7 @@ st.markdown("""
             <li>📊 <b>View mute meter analytics</b></li>
             <li>📈 <b>Traffic insights</b> and data trends</li>
             <li>📤 <b>Export reports and raw data</b></li>
+            <li>🩺 <b>Rank feeders and transformers</b> by health</li>
         </ul>
     </div>
 """, unsafe_allow_html=True)
\ No newline at end of file
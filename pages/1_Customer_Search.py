@@ -1,8 +1,17 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
+import plotly.express as px
 from helpers.navigation import setup_navigation
 from helpers.auth import check_authentication
+from helpers.queries import access_scope
+from helpers.lookup import lookup_record
+from helpers.constants import MUTE_REASONS
+from helpers.mute_queue import set_mute_reason
+from helpers.geo import meters_within
+from helpers.batch import (
+    BATCH_LIMIT, assign_reason, parse_references, references_from_upload,
+    resolve_references, unique_references
+)
 
 # 1. Page config (must be first)
 st.set_page_config(
@@ -22,44 +31,6 @@ st.session_state.current_page = "Customer Search"
 # Page content
 st.title("🔍 Customer Search")
 
-# Define mute reasons
-MUTE_REASONS = [
-    "Cable Jumper Loose", "Extra Phase Wire Loop", "GPRS Meter Bypass",
-    "Meter Washout", "Network Error", "Offline Due To Load Sheading",
-    "Screen Opened Slow", "SIM Card Faulty", "Structure Fallen Down",
-    "T/B Lock Heatup Slow", "Units Pending", "Running Direct", "Transformer Not At Site",
-    "No Communication", "D-FUSE Cut Off", "Service Drop Disconnected", "MDI Supply Fail",
-    "Display Opened", "Not In Use", "Not Found", "Pending Units",
-    "Supply Cut Off Due To Non-Payment", "MCO Not Take Up", "T/F Not At Site",
-    "Transformer Faulty", "T/F Burnt", "11KV Line Disconnected", "Wash Out",
-    "Meter Line Disconnected", "Meter Burnt", "LT Line Disconnected", "HT Line Disconnect",
-    "No Meter At Site"
-]
-
-# Filter data based on user access
-def filter_data(df):
-    if st.session_state.user_role != "admin":
-        access = st.session_state.access
-        if access.get('circle'):
-            df = df[df['Circle'] == access['circle']]
-        if access.get('division'):
-            df = df[df['Division'] == access['division']]
-        if access.get('subdivision'):
-            df = df[df['Sub-Division'] == access['subdivision']]
-        if access.get('feeder'):
-            df = df[df['Feeder'] == access['feeder']]
-    return df
-
-# Function to check if reference number exists
-def check_reference_exists(conn, ref_no):
-    try:
-        query = "SELECT COUNT(*) FROM meter_data WHERE Reference_no = ?"
-        result = conn.execute(query, (ref_no,)).fetchone()[0]
-        return result > 0
-    except Exception as e:
-        st.error(f"Error checking reference number: {str(e)}")
-        return False
-
 # Initialize session state for search results
 if 'search_results' not in st.session_state:
     st.session_state.search_results = None
@@ -70,6 +41,95 @@ if 'mute_reason_submitted' not in st.session_state:
 if 'selected_reason' not in st.session_state:
     st.session_state.selected_reason = None
 
+# Search mode: one reference, or a supervisor's list of them
+search_mode = st.radio("Search mode:", ["Single reference", "Batch"], horizontal=True)
+
+if search_mode == "Batch":
+    if 'batch_refs' not in st.session_state:
+        st.session_state.batch_refs = []
+        st.session_state.batch_results = None
+    
+    with st.form("batch_search_form"):
+        pasted = st.text_area(
+            "🔢 Paste reference numbers",
+            help="Separated by new lines, commas or spaces"
+        )
+        batch_file = st.file_uploader(
+            "…or upload a CSV/Excel file",
+            type=["csv", "xlsx"],
+            help="Uses the Reference_no column, or the first column if there is none"
+        )
+        batch_submitted = st.form_submit_button("Search")
+    
+    if batch_submitted:
+        try:
+            refs = parse_references(pasted)
+            if batch_file is not None:
+                refs += references_from_upload(batch_file)
+            refs = unique_references(refs)
+            if not refs:
+                st.warning("⚠️ Please enter or upload reference numbers")
+            elif len(refs) > BATCH_LIMIT:
+                st.error(f"❌ At most {BATCH_LIMIT:,} reference numbers per batch ({len(refs):,} given)")
+            else:
+                st.session_state.batch_refs = refs
+                st.session_state.batch_results = resolve_references(refs, access_scope())
+        except Exception as e:
+            st.error(f"⚠️ Database error: {str(e)}")
+    
+    if st.session_state.batch_results is not None:
+        found, missing, restricted = st.session_state.batch_results
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Found", len(found))
+        col2.metric("Not Found", len(missing))
+        col3.metric("Outside Your Access", len(restricted))
+        
+        if missing or restricted:
+            with st.expander("❓ Unmatched reference numbers"):
+                unmatched = pd.DataFrame({
+                    'Reference_no': missing + restricted,
+                    'Status': ["Not found"] * len(missing) + ["Outside your access"] * len(restricted)
+                })
+                st.dataframe(unmatched, use_container_width=True, hide_index=True)
+                st.download_button(
+                    "📥 Download unmatched",
+                    unmatched.to_csv(index=False),
+                    file_name="unmatched_references.csv",
+                    mime="text/csv"
+                )
+        
+        if not found.empty:
+            # Meters without a reason are ticked; reasons already set stay as they are
+            blank = found['mute_reason'].isna() | (found['mute_reason'].astype(str).str.strip() == "")
+            edited = st.data_editor(
+                found.assign(Select=blank),
+                column_order=['Select'] + list(found.columns),
+                disabled=list(found.columns),
+                hide_index=True,
+                use_container_width=True,
+                key=f"batch_select_{hash(tuple(st.session_state.batch_refs))}"
+            )
+            selected = edited.loc[edited['Select'] & blank, 'Reference_no'].tolist()
+            
+            with st.form("batch_reason_form"):
+                batch_reason = st.selectbox("📌 Select Mute Reason:", MUTE_REASONS)
+                st.caption(f"{len(selected):,} selected meters without a mute reason")
+                if st.form_submit_button("💾 Apply to Selected"):
+                    if not selected:
+                        st.warning("⚠️ No meters without a mute reason are selected")
+                    else:
+                        try:
+                            updated = assign_reason(batch_reason, access_scope(), refs=selected)
+                            st.session_state.batch_results = resolve_references(
+                                st.session_state.batch_refs, access_scope()
+                            )
+                            st.success(f"✅ Mute reason set to **{batch_reason}** on {updated:,} meters")
+                            if updated < len(selected):
+                                st.warning(f"⚠️ {len(selected) - updated:,} meters had a reason set meanwhile and were skipped")
+                        except Exception as e:
+                            st.error(f"⚠️ Failed to update mute reasons: {str(e)}")
+    st.stop()
+
 # Search form
 with st.form("customer_search_form"):
     ref_no = st.text_input("🔢 Enter Customer Reference No.", 
@@ -79,23 +139,16 @@ with st.form("customer_search_form"):
 
 if submitted and ref_no:
     try:
-        with sqlite3.connect("sepco_meters.db") as conn:
-            # Check if reference number exists
-            if not check_reference_exists(conn, ref_no):
-                st.warning("⚠️ No customer found with that Reference No.")
-                st.session_state.search_results = None
-                st.session_state.ref_no_searched = ""
-                st.session_state.mute_reason_submitted = False
-                st.stop()
-
-            df = pd.read_sql_query(
-                "SELECT * FROM meter_data WHERE Reference_no = ?", 
-                conn, 
-                params=(ref_no,)
-            )
-            df = filter_data(df)
+        # One indexed lookup (cached per process); access is checked in SQL
+        exists, df = lookup_record(ref_no, access_scope())
+        if not exists:
+            st.warning("⚠️ No customer found with that Reference No.")
+            st.session_state.search_results = None
+            st.session_state.ref_no_searched = ""
+            st.session_state.mute_reason_submitted = False
+            st.stop()
 
-        if not df.empty:
+        if df is not None:
             st.session_state.search_results = df
             st.session_state.ref_no_searched = ref_no
             st.session_state.mute_reason_submitted = False
@@ -132,20 +185,71 @@ if st.session_state.search_results is not None:
             )
             if st.form_submit_button("💾 Submit Mute Reason"):
                 try:
-                    with sqlite3.connect("sepco_meters.db") as conn:
-                        conn.execute(
-                            "UPDATE meter_data SET mute_reason = ? WHERE Reference_no = ?", 
-                            (selected_reason, st.session_state.ref_no_searched)
-                        )
-                        conn.commit()
-                    # Update search results with new mute reason
-                    st.session_state.search_results.iloc[0]["mute_reason"] = selected_reason
-                    st.session_state.mute_reason_submitted = True
-                    st.session_state.selected_reason = selected_reason
-                    st.success(f"✅ Mute reason updated to: **{selected_reason}**")
+                    # Returns once the batch holding this submission is committed
+                    if set_mute_reason(st.session_state.ref_no_searched, selected_reason):
+                        # Update search results with new mute reason
+                        results = st.session_state.search_results
+                        results.loc[results.index[0], "mute_reason"] = selected_reason
+                        st.session_state.mute_reason_submitted = True
+                        st.session_state.selected_reason = selected_reason
+                        st.success(f"✅ Mute reason updated to: **{selected_reason}**")
+                    else:
+                        st.warning("⚠️ A mute reason was already set for this meter. Search again to see it.")
+                except TimeoutError:
+                    st.warning("⏳ The database is busy with an import. Nothing was saved; please submit again in a moment.")
                 except Exception as e:
                     st.error(f"⚠️ Failed to update mute reason: {str(e)}")
 
     # Show confirmation if mute reason was submitted
     if st.session_state.mute_reason_submitted:
-        st.info(f"🛑 Mute reason set: **{st.session_state.selected_reason}**")
\ No newline at end of file
+        st.info(f"🛑 Mute reason set: **{st.session_state.selected_reason}**")
+    # Nearby meters around the searched customer (spatial index lookup)
+    customer = st.session_state.search_results.iloc[0]
+    if pd.notna(customer["Latitude"]) and pd.notna(customer["Longitude"]):
+        with st.expander("📍 Nearby Meters"):
+            col1, col2 = st.columns(2)
+            with col1:
+                radius_km = st.slider("Radius (km):", 0.5, 10.0, 2.0, step=0.5)
+            with col2:
+                nearby_mute_only = st.checkbox("Mute meters only", value=True)
+            
+            try:
+                nearby = meters_within(
+                    access_scope(),
+                    float(customer["Latitude"]),
+                    float(customer["Longitude"]),
+                    radius_km,
+                    mute_only=nearby_mute_only
+                )
+                nearby = nearby[nearby['Reference_no'] != customer["Reference_no"]]
+            except Exception as e:
+                st.error(f"⚠️ Failed to load nearby meters: {str(e)}")
+                nearby = pd.DataFrame()
+            
+            if nearby.empty:
+                st.info(f"No {'mute ' if nearby_mute_only else ''}meters within {radius_km} km")
+            else:
+                st.caption(f"{len(nearby):,} {'mute ' if nearby_mute_only else ''}meters within {radius_km} km")
+                fig_nearby = px.scatter_mapbox(
+                    nearby,
+                    lat='Latitude',
+                    lon='Longitude',
+                    color='mute_reason' if nearby_mute_only else None,
+                    hover_data=['Reference_no', 'Name', 'Feeder', 'distance_km'],
+                    mapbox_style="open-street-map",
+                    zoom=12,
+                    height=400
+                )
+                fig_nearby.add_scattermapbox(
+                    lat=[customer["Latitude"]],
+                    lon=[customer["Longitude"]],
+                    mode='markers',
+                    marker=dict(size=14, color='black'),
+                    name=str(customer["Reference_no"])
+                )
+                fig_nearby.update_layout(
+                    margin={"r":0,"t":0,"l":0,"b":0},
+                    mapbox=dict(center=dict(lat=customer["Latitude"], lon=customer["Longitude"]))
+                )
+                st.plotly_chart(fig_nearby, use_container_width=True)
+                st.dataframe(nearby, use_container_width=True, height=300)
@@ -1,9 +1,22 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
 import plotly.express as px
 from helpers.navigation import setup_navigation
 from helpers.auth import check_authentication
+from helpers.store import load_data, is_mute
+from helpers.queries import access_scope, narrow_scope
+from helpers.summary import mute_reason_counts
+from helpers.hierarchy import filter_options
+from helpers.export import export_builder, export_query
+from helpers.geo import (
+    DEFAULT_ZOOM, MAX_ZOOM, MIN_ZOOM, POINT_LIMIT,
+    cell_bounds, meters_in_bbox, mute_clusters, mute_point_count, mute_points
+)
+from helpers.trends import mttr_by, mute_trend
+from helpers.partitions import DIFF_SETS, diff_counts, diff_meters, snapshot_days
+
+# Trend windows offered on the Trends tab (days; None is all history)
+TREND_PERIODS = {"Last 30 days": 30, "Last 90 days": 90, "Last year": 365, "All history": None}
 
 # 1. Page config (must be first)
 st.set_page_config(
@@ -23,147 +36,262 @@ st.session_state.current_page = "Mute Analytics"
 # Page content
 st.title("📊 Mute Analytics")
 
-def filter_data(df):
-    # Check if user is admin or if access exists in session state
-    if st.session_state.user_role == "admin":
-        return df  # Admins see all data
-    
-    # Safely check for access object
-    if not hasattr(st.session_state, 'access'):
-        st.error("Access permissions not properly initialized")
-        st.stop()
-    
-    access = st.session_state.access
-    
-    # Apply filters only if they exist in the access object
-    if access.get('circle'):
-        df = df[df['Circle'] == access['circle']]
-    if access.get('division'):
-        df = df[df['Division'] == access['division']]
-    if access.get('subdivision'):
-        df = df[df['Sub-Division'] == access['subdivision']]
-    if access.get('feeder'):
-        df = df[df['Feeder'] == access['feeder']]
-    
-    return df
+scope = access_scope()
 
-# Load data with caching
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def load_data():
-    try:
-        with sqlite3.connect("sepco_meters.db") as conn:
-            df = pd.read_sql_query("SELECT * FROM meter_data", conn)
-        df['mute_reason'] = df['mute_reason'].replace('', 'None')
-        df['Latitude'] = pd.to_numeric(df['Latitude'], errors='coerce')
-        df['Longitude'] = pd.to_numeric(df['Longitude'], errors='coerce')
-        return df
-    except Exception as e:
-        st.error(f"Failed to load data: {str(e)}")
-        return pd.DataFrame()
-
-df = load_data()
-df = filter_data(df)
-
-# Sidebar filters
+# Sidebar filters (each selection narrows the scope the next one lists)
 with st.sidebar:
     st.header("🔍 Filter Options")
     
     # Circle filter
-    circle_options = ["All"] + sorted(df['Circle'].dropna().unique().tolist())
-    circle = st.selectbox("Select Circle:", circle_options)
-    if circle != "All":
-        df = df[df['Circle'] == circle]
+    circle = st.selectbox("Select Circle:", filter_options(scope, 'circle'))
+    scope = narrow_scope(scope, circle=circle)
     
     # Division filter
-    division_options = ["All"] + sorted(df['Division'].dropna().unique().tolist())
-    division = st.selectbox("Select Division:", division_options)
-    if division != "All":
-        df = df[df['Division'] == division]
+    division = st.selectbox("Select Division:", filter_options(scope, 'division'))
+    scope = narrow_scope(scope, division=division)
     
     # Sub-Division filter
-    subdiv_options = ["All"] + sorted(df['Sub-Division'].dropna().unique().tolist())
-    subdiv = st.selectbox("Select Sub-Division:", subdiv_options)
-    if subdiv != "All":
-        df = df[df['Sub-Division'] == subdiv]
+    subdiv = st.selectbox("Select Sub-Division:", filter_options(scope, 'subdivision'))
+    scope = narrow_scope(scope, subdivision=subdiv)
     
     # Feeder filter
-    feeder_options = ["All"] + sorted(df['Feeder'].dropna().unique().tolist())
-    feeder = st.selectbox("Select Feeder:", feeder_options)
-    if feeder != "All":
-        df = df[df['Feeder'] == feeder]
+    feeder = st.selectbox("Select Feeder:", filter_options(scope, 'feeder'))
+    scope = narrow_scope(scope, feeder=feeder)
 
-# Filter only mute meters
-mute_df = df[df['mute_reason'].notnull() & (df['mute_reason'] != 'None')]
+df = load_data(scope)
 
-if mute_df.empty:
-    st.warning("No mute meters available for selected filters.")
-    st.stop()
+# Filter only mute meters
+mute_df = df[is_mute(df)]
 
 # Main content layout
-tab1, tab2 = st.tabs(["📊 Mute Reasons Analysis", "🗺️ Geographic Distribution"])
+tab1, tab2, tab3 = st.tabs(["📊 Mute Reasons Analysis", "🗺️ Geographic Distribution", "📈 Trends"])
 
 with tab1:
-    # Bar Graph: Top Mute Reasons
-    st.subheader("🔧 Top Mute Reasons")
-    mute_counts = mute_df['mute_reason'].value_counts().reset_index()
-    mute_counts.columns = ['Mute Reason', 'Count']
+    if mute_df.empty:
+        st.warning("No mute meters available for selected filters.")
+    else:
+        # Bar Graph: Top Mute Reasons
+        st.subheader("🔧 Top Mute Reasons")
+        # Counts come from the mute_summary rollup, not a scan of mute_df
+        mute_counts = mute_reason_counts(scope)
     
-    # Sort by count and limit to top 20 for better visualization
-    mute_counts = mute_counts.sort_values('Count', ascending=False).head(20)
+        # Sorted by count; limit to top 20 for better visualization
+        mute_counts = mute_counts.head(20)
     
-    fig_mute = px.bar(
-        mute_counts, 
-        x='Mute Reason', 
-        y='Count', 
-        color='Mute Reason',
-        text='Count',
-        height=500
-    )
-    fig_mute.update_traces(textposition='outside')
-    fig_mute.update_layout(
-        xaxis_title="Mute Reason",
-        yaxis_title="Count",
-        showlegend=False,
-        xaxis={'categoryorder':'total descending'}
-    )
-    st.plotly_chart(fig_mute, use_container_width=True)
-
-    # Data table
-    st.subheader("📋 Detailed Mute Meter Data")
-    st.dataframe(
-        mute_df[['Reference_no', 'Name', 'Circle', 'Division', 'Sub-Division', 'Feeder', 'mute_reason']],
-        use_container_width=True,
-        height=400
-    )
+        fig_mute = px.bar(
+            mute_counts, 
+            x='Mute Reason', 
+            y='Count', 
+            color='Mute Reason',
+            text='Count',
+            height=500
+        )
+        fig_mute.update_traces(textposition='outside')
+        fig_mute.update_layout(
+            xaxis_title="Mute Reason",
+            yaxis_title="Count",
+            showlegend=False,
+            xaxis={'categoryorder':'total descending'}
+        )
+        st.plotly_chart(fig_mute, use_container_width=True)
+
+        # Data table
+        st.subheader("📋 Detailed Mute Meter Data")
+        st.dataframe(
+            mute_df[['Reference_no', 'Name', 'Circle', 'Division', 'Sub-Division', 'Feeder', 'mute_reason']],
+            use_container_width=True,
+            height=400
+        )
 
 with tab2:
-    # Map: Mute Meter Locations
-    st.subheader("🗺️ Mute Meter Geographic Distribution")
-    mute_map = mute_df.dropna(subset=['Latitude', 'Longitude'])
+    if mute_df.empty:
+        st.warning("No mute meters available for selected filters.")
+    else:
+        # Map: Mute Meter Locations
+        st.subheader("🗺️ Mute Meter Geographic Distribution")
+    
+        # Small views are drawn point by point; larger ones as grid clusters
+        # binned server-side, so the payload stays bounded
+        point_count = mute_point_count(scope)
+    
+        if point_count == 0:
+            st.warning("No valid GPS coordinates available for the selected mute meters.")
+        elif point_count <= POINT_LIMIT:
+            mute_map = mute_points(scope)
+            fig_map = px.scatter_mapbox(
+                mute_map,
+                lat='Latitude',
+                lon='Longitude',
+                color='mute_reason',
+                hover_data=['Reference_no', 'Name', 'Feeder', 'Division'],
+                mapbox_style="open-street-map",
+                zoom=5,
+                height=600
+            )
+            fig_map.update_layout(
+                margin={"r":0,"t":0,"l":0,"b":0},
+                mapbox=dict(center=dict(lat=mute_map['Latitude'].mean(), lon=mute_map['Longitude'].mean()))
+            )
+            st.plotly_chart(fig_map, use_container_width=True)
+        else:
+            zoom = st.slider(
+                "Map detail (zoom level):",
+                MIN_ZOOM, MAX_ZOOM, DEFAULT_ZOOM,
+                help=f"{point_count:,} mute meters are grouped into clusters. "
+                     "Narrow the filters to see individual meters."
+            )
+            clusters, zoom = mute_clusters(scope, zoom)
+            st.caption(f"{point_count:,} mute meters in {len(clusters):,} clusters (colored by most common reason)")
+        
+            fig_map = px.scatter_mapbox(
+                clusters,
+                lat='Latitude',
+                lon='Longitude',
+                size='count',
+                color='top_reason',
+                hover_data={'count': True, 'breakdown': True, 'Latitude': False, 'Longitude': False},
+                labels={'count': "Mute meters", 'top_reason': "Most common reason", 'breakdown': "Reasons"},
+                mapbox_style="open-street-map",
+                zoom=zoom,
+                size_max=40,
+                height=600
+            )
+            weights = clusters['count'] / clusters['count'].sum()
+            fig_map.update_layout(
+                margin={"r":0,"t":0,"l":0,"b":0},
+                mapbox=dict(center=dict(
+                    lat=(clusters['Latitude'] * weights).sum(),
+                    lon=(clusters['Longitude'] * weights).sum()
+                ))
+            )
+            event = st.plotly_chart(
+                fig_map,
+                use_container_width=True,
+                key="mute_cluster_map",
+                on_select="rerun",
+                selection_mode="points"
+            )
+        
+            # Clicking a cluster lists the meters in its grid cell
+            selected = [p for p in event.selection.points if 'lat' in p and 'lon' in p]
+            if selected:
+                bounds = cell_bounds(selected[0]['lat'], selected[0]['lon'], zoom)
+                cell_meters = meters_in_bbox(scope, *bounds, mute_only=True)
+                st.markdown(f"#### 📍 {len(cell_meters):,} mute meters in the selected cluster")
+                fig_cell = px.scatter_mapbox(
+                    cell_meters,
+                    lat='Latitude',
+                    lon='Longitude',
+                    color='mute_reason',
+                    hover_data=['Reference_no', 'Name', 'Feeder', 'Division'],
+                    mapbox_style="open-street-map",
+                    zoom=min(zoom + 2, MAX_ZOOM),
+                    height=450
+                )
+                fig_cell.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
+                st.plotly_chart(fig_cell, use_container_width=True)
+                st.dataframe(cell_meters, use_container_width=True, height=300)
+
+with tab3:
+    st.subheader("📈 Mute Trends")
+    col1, col2 = st.columns(2)
+    with col1:
+        period = st.selectbox("Period:", list(TREND_PERIODS), index=1)
+    with col2:
+        freq = st.radio("Group by:", ["day", "week"], format_func=str.title, horizontal=True)
+    
+    try:
+        trend = mute_trend(scope, freq, TREND_PERIODS[period])
+        # MTTR is tracked per Sub-Division; within one, compare its feeders
+        mttr_column = 'Feeder' if scope.get('subdivision') or scope.get('feeder') else 'Sub-Division'
+        mttr = mttr_by(scope, mttr_column, TREND_PERIODS[period])
+    except Exception as e:
+        st.error(f"⚠️ Failed to load trends: {str(e)}")
+        trend = mttr = pd.DataFrame()
     
-    if not mute_map.empty:
-        fig_map = px.scatter_mapbox(
-            mute_map,
-            lat='Latitude',
-            lon='Longitude',
-            color='mute_reason',
-            hover_data=['Reference_no', 'Name', 'Feeder', 'Division'],
-            mapbox_style="open-street-map",
-            zoom=5,
-            height=600
+    if trend.empty:
+        st.info("No mute history recorded yet for the selected filters.")
+    else:
+        restored = trend['Restored'].sum()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Newly Mute", f"{trend['Muted'].sum():,}")
+        col2.metric("Restored", f"{restored:,}")
+        col3.metric("Current Backlog", f"{trend['Backlog'].iloc[-1]:,}")
+        if restored:
+            mean_hours = (trend['MTTR (h)'] * trend['Restored']).sum() / restored
+            col4.metric("MTTR", f"{mean_hours:,.1f} h")
+        else:
+            col4.metric("MTTR", "–")
+        
+        fig_events = px.bar(
+            trend.melt(id_vars='Date', value_vars=['Muted', 'Restored'], var_name='Event', value_name='Meters'),
+            x='Date',
+            y='Meters',
+            color='Event',
+            barmode='group',
+            title=f"Mute and Restore Events per {freq.title()}",
+            height=400
         )
-        fig_map.update_layout(
-            margin={"r":0,"t":0,"l":0,"b":0},
-            mapbox=dict(center=dict(lat=mute_map['Latitude'].mean(), lon=mute_map['Longitude'].mean()))
+        st.plotly_chart(fig_events, use_container_width=True)
+        
+        fig_backlog = px.line(
+            trend,
+            x='Date',
+            y='Backlog',
+            title="Mute Backlog",
+            markers=freq == 'week',
+            height=350
         )
-        st.plotly_chart(fig_map, use_container_width=True)
+        st.plotly_chart(fig_backlog, use_container_width=True)
+        
+        st.subheader(f"⏱️ Mean Time to Restore by {mttr_column}")
+        if mttr.empty:
+            st.info("No meters were restored in this period.")
+        else:
+            st.dataframe(
+                mttr.style.format({'MTTR (h)': "{:,.1f}"}),
+                use_container_width=True,
+                hide_index=True
+            )
+    
+    # Mute population of two daily AMR loads (Admin > Data Import, snapshot mode)
+    st.subheader("🔁 Compare Daily Loads")
+    try:
+        loads = snapshot_days()
+    except Exception as e:
+        st.error(f"⚠️ Failed to list daily loads: {str(e)}")
+        loads = pd.DataFrame()
+    
+    if len(loads) < 2:
+        st.info("At least two daily snapshots are needed for a comparison.")
     else:
-        st.warning("No valid GPS coordinates available for the selected mute meters.")
+        col1, col2 = st.columns(2)
+        with col1:
+            older = st.selectbox("Earlier load:", loads['Date'], index=1, format_func=lambda d: f"{d:%d %b %Y}")
+        with col2:
+            newer = st.selectbox("Later load:", loads['Date'], index=0, format_func=lambda d: f"{d:%d %b %Y}")
+        
+        if older >= newer:
+            st.warning("⚠️ Pick an earlier load on the left and a later one on the right.")
+        else:
+            try:
+                counts = diff_counts(older, newer, scope)
+                for col, (kind, label) in zip(st.columns(len(DIFF_SETS)), DIFF_SETS.items()):
+                    col.metric(label, f"{counts[kind]:,}")
+                
+                diff_kind = st.radio("Show:", list(DIFF_SETS), format_func=DIFF_SETS.get, horizontal=True)
+                st.dataframe(
+                    diff_meters(older, newer, diff_kind, scope),
+                    use_container_width=True,
+                    height=300
+                )
+            except Exception as e:
+                st.error(f"⚠️ Failed to compare daily loads: {str(e)}")
 
-# Download button for filtered data
+# Download button for filtered data (built only when clicked)
 st.sidebar.download_button(
     label="📥 Download Filtered Data",
-    data=mute_df.to_csv(index=False).encode('utf-8'),
+    data=export_builder('csv', *export_query(scope, mute_only=True)),
     file_name=f"mute_meters_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
     mime='text/csv'
 )
\ No newline at end of file
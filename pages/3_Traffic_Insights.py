@@ -1,9 +1,15 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
 import plotly.express as px
 from helpers.navigation import setup_navigation
 from helpers.auth import check_authentication
+from helpers.export import export_builder, export_query
+from helpers.queries import access_scope, narrow_scope
+from helpers.hierarchy import filter_options
+from helpers.aggregates import (
+    capacity_by_division, installations_by_month, load_histogram, tariff_counts
+)
+from helpers.cube import DIMENSIONS, MEASURES, rollup, slice_cube, tariff_cube
 
 # 1. Page config (must be first)
 st.set_page_config(
@@ -23,81 +29,54 @@ st.session_state.current_page = "Traffic Insights"
 # Page content
 st.title("🚦 Traffic Insights")
 
-# Load data with caching and error handling
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def load_data():
-    try:
-        with sqlite3.connect("sepco_meters.db") as conn:
-            df = pd.read_sql("SELECT * FROM meter_data WHERE `Sr. No.` != '0';", conn)
-        
-        # Data cleaning
-        df['Sanction Load'] = pd.to_numeric(df['Sanction Load'], errors='coerce')
-        df['Transformer Capacity'] = pd.to_numeric(df['Transformer Capacity'], errors='coerce')
-        df['Installation Date'] = pd.to_datetime(df['Installation Date'], errors='coerce')
-        
-        # Filter based on user access
-        if st.session_state.user_role != "admin":
-            access = st.session_state.access
-            if access.get('circle'):
-                df = df[df['Circle'] == access['circle']]
-            if access.get('division'):
-                df = df[df['Division'] == access['division']]
-            if access.get('subdivision'):
-                df = df[df['Sub-Division'] == access['subdivision']]
-            if access.get('feeder'):
-                df = df[df['Feeder'] == access['feeder']]
-        
-        return df
-    
-    except Exception as e:
-        st.error(f"Failed to load data: {str(e)}")
-        return pd.DataFrame()
+def drill_down(by):
+    # Clicking a bar filters on it and breaks down by the next open dimension
+    points = st.session_state.cube_chart.selection.points
+    if not points:
+        return
+    st.session_state[f"cube_{by}"] = points[0]['x']
+    remaining = [d for d in DIMENSIONS if d != by and st.session_state.get(f"cube_{d}", "All") == "All"]
+    if remaining:
+        st.session_state.cube_by = remaining[0]
 
-df = load_data()
+def reset_drill_down():
+    for name in DIMENSIONS:
+        st.session_state[f"cube_{name}"] = "All"
 
-# Sidebar filters
+scope = access_scope()
+
+# Sidebar filters (each selection narrows the scope the next one lists)
 with st.sidebar:
     st.header("🔍 Filter Options")
     
     # Circle filter
-    circle_options = ["All"] + sorted(df['Circle'].dropna().unique().tolist())
-    selected_circle = st.selectbox("Select Circle:", circle_options)
+    selected_circle = st.selectbox("Select Circle:", filter_options(scope, 'circle'))
+    scope = narrow_scope(scope, circle=selected_circle)
     
     # Division filter
-    division_options = ["All"] + sorted(df['Division'].dropna().unique().tolist())
-    selected_div = st.selectbox("Select Division:", division_options)
+    selected_div = st.selectbox("Select Division:", filter_options(scope, 'division'))
+    scope = narrow_scope(scope, division=selected_div)
     
     # Sub-Division filter
-    subdiv_options = ["All"] + sorted(df['Sub-Division'].dropna().unique().tolist())
-    selected_subdiv = st.selectbox("Select Sub-Division:", subdiv_options)
+    selected_subdiv = st.selectbox("Select Sub-Division:", filter_options(scope, 'subdivision'))
+    scope = narrow_scope(scope, subdivision=selected_subdiv)
     
     # Feeder filter
-    feeder_options = ["All"] + sorted(df['Feeder'].dropna().unique().tolist())
-    selected_feeder = st.selectbox("Select Feeder:", feeder_options)
-
-# Apply filters
-filtered_df = df.copy()
-if selected_circle != "All":
-    filtered_df = filtered_df[filtered_df['Circle'] == selected_circle]
-if selected_div != "All":
-    filtered_df = filtered_df[filtered_df['Division'] == selected_div]
-if selected_subdiv != "All":
-    filtered_df = filtered_df[filtered_df['Sub-Division'] == selected_subdiv]
-if selected_feeder != "All":
-    filtered_df = filtered_df[filtered_df['Feeder'] == selected_feeder]
+    selected_feeder = st.selectbox("Select Feeder:", filter_options(scope, 'feeder'))
+    scope = narrow_scope(scope, feeder=selected_feeder)
 
 # Main content tabs
-tab1, tab2 = st.tabs(["📊 Tariff Analysis", "⚡ Load Analysis"])
+tab1, tab2, tab3 = st.tabs(["📊 Tariff Analysis", "⚡ Load Analysis", "🧊 Drill-Down"])
 
 with tab1:
     # Tariff Distribution
     st.subheader("📘 Tariff Category Distribution")
-    if not filtered_df.empty:
-        tariff_counts = filtered_df['Tariff'].value_counts().reset_index()
-        tariff_counts.columns = ['Tariff', 'Count']
-        
+    # Charts get pre-aggregated data (NumPy bincount over the cached frame,
+    # cached per data version)
+    tariff_data = tariff_counts(scope)
+    if not tariff_data.empty:
         fig_tariff = px.pie(
-            tariff_counts, 
+            tariff_data, 
             names='Tariff', 
             values='Count',
             hole=0.3,
@@ -109,7 +88,7 @@ with tab1:
         # Detailed tariff data
         with st.expander("View Detailed Tariff Data"):
             st.dataframe(
-                tariff_counts.sort_values('Count', ascending=False),
+                tariff_data,
                 use_container_width=True
             )
     else:
@@ -121,13 +100,15 @@ with tab2:
     with col1:
         # Sanction Load Distribution
         st.subheader("🔌 Sanction Load (kW)")
-        if not filtered_df.empty:
-            fig_sanction = px.histogram(
-                filtered_df, 
+        load_bins = load_histogram(scope)
+        if not load_bins.empty:
+            fig_sanction = px.bar(
+                load_bins, 
                 x='Sanction Load', 
-                nbins=20,
+                y='Count',
                 color_discrete_sequence=['#636EFA']
             )
+            fig_sanction.update_traces(width=load_bins['Width'].iloc[0])
             fig_sanction.update_layout(
                 xaxis_title="Sanction Load (kW)",
                 yaxis_title="Number of Meters"
@@ -137,8 +118,8 @@ with tab2:
     with col2:
         # Transformer Capacity
         st.subheader("⚡ Transformer Capacity (kVA)")
-        if not filtered_df.empty:
-            cap_by_div = filtered_df.groupby('Division')['Transformer Capacity'].sum().reset_index()
+        cap_by_div = capacity_by_division(scope)
+        if not cap_by_div.empty:
             fig_cap = px.bar(
                 cap_by_div, 
                 x='Division', 
@@ -155,12 +136,8 @@ with tab2:
     
     # Installation Trend
     st.subheader("📅 Meter Installation Trend")
-    if not filtered_df.empty:
-        install_trend = filtered_df.groupby(
-            filtered_df['Installation Date'].dt.to_period('M')
-        ).size().reset_index(name='Count')
-        install_trend['Installation Date'] = install_trend['Installation Date'].astype(str)
-        
+    install_trend = installations_by_month(scope)
+    if not install_trend.empty:
         fig_trend = px.line(
             install_trend, 
             x='Installation Date', 
@@ -173,11 +150,77 @@ with tab2:
             yaxis_title="Number of Installations"
         )
         st.plotly_chart(fig_trend, use_container_width=True)
+    else:
+        st.info("No installation dates recorded for selected filters")
+
+with tab3:
+    st.subheader("🧊 Tariff × Division × Load × Meter Type")
+    # Pre-aggregated cube (one cell per combination), sliced in memory
+    cube = tariff_cube(scope)
+    if cube.empty:
+        st.warning("No data available for selected filters")
+    else:
+        # Each dimension's choices are narrowed by the ones before it
+        filters = {}
+        for col, name in zip(st.columns(len(DIMENSIONS)), DIMENSIONS):
+            options = ["All"] + sorted(slice_cube(cube, filters)[name].unique())
+            with col:
+                value = st.selectbox(f"{name}:", options, key=f"cube_{name}")
+            if value != "All":
+                filters[name] = value
+        
+        cells = slice_cube(cube, filters)
+        open_dimensions = [d for d in DIMENSIONS if d not in filters]
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            by = st.radio("Break down by:", open_dimensions, horizontal=True, key="cube_by") if open_dimensions else None
+        with col2:
+            measure = st.radio("Measure:", MEASURES, horizontal=True)
+        with col3:
+            st.button("↩️ Reset Drill-Down", on_click=reset_drill_down)
+        
+        totals = rollup(cells, [])
+        st.caption(
+            f"{int(totals['Meters'].iloc[0]):,} meters · "
+            f"{totals['Sanction Load (kW)'].iloc[0]:,.0f} kW sanctioned"
+        )
+        
+        if by:
+            breakdown = rollup(cells, [by])
+            fig_drill = px.bar(
+                breakdown,
+                x=by,
+                y=measure,
+                color=by,
+                text=measure,
+                height=450
+            )
+            fig_drill.update_traces(texttemplate='%{text:,.0f}', textposition='outside')
+            fig_drill.update_layout(showlegend=False, xaxis={'categoryorder': 'total descending'})
+            st.plotly_chart(
+                fig_drill,
+                use_container_width=True,
+                key="cube_chart",
+                on_select=lambda by=by: drill_down(by),
+                selection_mode="points"
+            )
+            st.caption("Click a bar to drill down into it")
+            
+            cross = st.selectbox("Cross-tab with:", ["None"] + [d for d in open_dimensions if d != by])
+            if cross == "None":
+                st.dataframe(breakdown, use_container_width=True, hide_index=True)
+            else:
+                st.dataframe(
+                    rollup(cells, [by, cross]).pivot_table(
+                        index=by, columns=cross, values=measure, aggfunc='sum', fill_value=0
+                    ),
+                    use_container_width=True
+                )
 
-# Download button for filtered data
+# Download button for filtered data (built only when clicked)
 st.sidebar.download_button(
     label="📥 Download Filtered Data",
-    data=filtered_df.to_csv(index=False).encode('utf-8'),
+    data=export_builder('csv', *export_query(scope)),
     file_name=f"tariff_insights_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
     mime='text/csv'
 )
\ No newline at end of file
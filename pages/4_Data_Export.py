@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
 from helpers.navigation import setup_navigation
 from helpers.auth import check_authentication
-from io import BytesIO
+from helpers.store import load_data, is_mute
+from helpers.queries import access_scope, narrow_scope
+from helpers.hierarchy import filter_options
+from helpers.export_jobs import export_panel
+from helpers.export import count_rows, export_query, preview_rows
 
 # 1. Page config (must be first)
 st.set_page_config(
@@ -23,79 +26,38 @@ st.session_state.current_page = "Data Export"
 # Page content
 st.title("📤 Data Export")
 
-# Load data with caching and error handling
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def load_data():
-    try:
-        with sqlite3.connect("sepco_meters.db") as conn:
-            df = pd.read_sql_query("SELECT * FROM meter_data", conn)
-        df['mute_reason'] = df['mute_reason'].replace('', 'None')
-        return df
-    except Exception as e:
-        st.error(f"Failed to load data: {str(e)}")
-        return pd.DataFrame()
+scope = access_scope()
 
-def filter_data(df):
-    # Check if user is admin or if access exists in session state
-    if st.session_state.user_role == "admin":
-        return df  # Admins see all data
-    
-    # Safely check for access object
-    if not hasattr(st.session_state, 'access'):
-        st.error("Access permissions not properly initialized")
-        st.stop()
-    
-    access = st.session_state.access
-    
-    # Apply filters only if they exist in the access object
-    if access.get('circle'):
-        df = df[df['Circle'] == access['circle']]
-    if access.get('division'):
-        df = df[df['Division'] == access['division']]
-    if access.get('subdivision'):
-        df = df[df['Sub-Division'] == access['subdivision']]
-    if access.get('feeder'):
-        df = df[df['Feeder'] == access['feeder']]
-    
-    return df
-
-df = load_data()
-df = filter_data(df)
-
-# Filter options in expandable section
+# Filter options in expandable section (each selection narrows the next)
 with st.expander("🔍 Filter Options", expanded=True):
     col1, col2 = st.columns(2)
     
     with col1:
         circle = st.selectbox(
             "Select Circle:", 
-            ["All"] + sorted(df['Circle'].dropna().unique().tolist())
+            filter_options(scope, 'circle')
         )
+        scope = narrow_scope(scope, circle=circle)
         division = st.selectbox(
             "Select Division:", 
-            ["All"] + sorted(df['Division'].dropna().unique().tolist())
+            filter_options(scope, 'division')
         )
+        scope = narrow_scope(scope, division=division)
     
     with col2:
         subdiv = st.selectbox(
             "Select Sub-Division:", 
-            ["All"] + sorted(df['Sub-Division'].dropna().unique().tolist())
+            filter_options(scope, 'subdivision')
         )
+        scope = narrow_scope(scope, subdivision=subdiv)
         feeder = st.selectbox(
             "Select Feeder:", 
-            ["All"] + sorted(df['Feeder'].dropna().unique().tolist())
+            filter_options(scope, 'feeder')
         )
+        scope = narrow_scope(scope, feeder=feeder)
 
 # Apply filters
-filtered_df = df.copy()
-if circle != "All":
-    filtered_df = filtered_df[filtered_df['Circle'] == circle]
-if division != "All":
-    filtered_df = filtered_df[filtered_df['Division'] == division]
-if subdiv != "All":
-    filtered_df = filtered_df[filtered_df['Sub-Division'] == subdiv]
-if feeder != "All":
-    filtered_df = filtered_df[filtered_df['Feeder'] == feeder]
+filtered_df = load_data(scope)
 
 # Data type selection
 data_type = st.radio(
@@ -104,71 +66,53 @@ data_type = st.radio(
     horizontal=True
 )
 
-if data_type == "Mute Meters Only":
-    export_df = filtered_df[filtered_df['mute_reason'].notnull() & (filtered_df['mute_reason'] != 'None')]
+mute_only = data_type == "Mute Meters Only"
+if mute_only:
+    export_df = filtered_df[is_mute(filtered_df)]
 else:
     export_df = filtered_df
 
+# Counted with the export's own query, so the figure matches the file
+export_sql, export_params = export_query(scope, mute_only)
+record_count = count_rows(export_sql, export_params)
+
 # Display results and export options
-if export_df.empty:
+if record_count == 0:
     st.warning("⚠️ No records found matching your filters")
 else:
-    st.success(f"✅ Found {len(export_df)} records matching your criteria")
+    st.success(f"✅ Found {record_count} records matching your criteria")
     
     with st.expander("🔍 Preview Data"):
+        # Only the first rows are sent to the browser; exports have them all
+        preview = preview_rows(export_sql, export_params)
+        if len(preview) < record_count:
+            st.caption(f"Showing the first {len(preview):,} of {record_count:,} records")
         st.dataframe(
-            export_df,
+            preview,
             height=400,
             use_container_width=True
         )
     
-    # Export options
+    # Export options: built in the background and cached until the data changes
     st.markdown("### 📤 Export Options")
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        # Excel export
-        excel_buffer = BytesIO()
-        export_df.to_excel(excel_buffer, index=False)
-        st.download_button(
-            label="💾 Download as Excel",
-            data=excel_buffer.getvalue(),
-            file_name="sepco_data_export.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-    
-    with col2:
-        # CSV export
-        csv_buffer = BytesIO()
-        export_df.to_csv(csv_buffer, index=False)
-        st.download_button(
-            label="📄 Download as CSV",
-            data=csv_buffer.getvalue(),
-            file_name="sepco_data_export.csv",
-            mime="text/csv"
-        )
-    
-    with col3:
-        # JSON export
-        json_buffer = BytesIO()
-        export_df.to_json(json_buffer, orient='records')
-        st.download_button(
-            label="📊 Download as JSON",
-            data=json_buffer.getvalue(),
-            file_name="sepco_data_export.json",
-            mime="application/json"
-        )
+    export_panel(
+        scope,
+        mute_only,
+        ['xlsx', 'csv', 'json', 'ndjson'],
+        "sepco_data_export",
+        "data_export"
+    )
 
     # Additional statistics
     st.markdown("### 📊 Quick Statistics")
     stats_col1, stats_col2, stats_col3 = st.columns(3)
     
     with stats_col1:
-        st.metric("Total Records", len(export_df))
+        st.metric("Total Records", record_count)
     
     with stats_col2:
         if 'mute_reason' in export_df.columns:
-            mute_count = len(export_df[export_df['mute_reason'].notnull() & (export_df['mute_reason'] != 'None')])
+            mute_count = int(is_mute(export_df).sum())
             st.metric("Mute Meters", mute_count)
     
     with stats_col3:
@@ -2,9 +2,19 @@ import streamlit as st
 import pandas as pd
 import sqlite3
 import bcrypt
-from io import BytesIO 
 from helpers.navigation import setup_navigation
 from helpers.auth import check_authentication
+from helpers.store import get_store, is_mute
+from helpers.queries import narrow_scope
+from helpers.export_jobs import export_panel
+from helpers.export import export_query, preview_rows
+from helpers.importer import IMPORT_MODES, import_meter_data
+from helpers.db import reader, writer
+from helpers.hierarchy import filter_options
+from helpers.batch import (
+    BULK_LIMIT, assign_reason, references_from_upload, target_count, unique_references
+)
+from helpers.constants import MUTE_REASONS
 
 # PAGE CONFIG
 st.set_page_config(page_title="SEPCO Dashboard - Admin Portal", layout="wide")
@@ -24,20 +34,23 @@ def hash_password(password):
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 def load_filter_options():
+    # Access can be granted at any level, so each list covers every value
     try:
-        with sqlite3.connect("sepco_meters.db") as conn:
-            df = pd.read_sql_query(
-                "SELECT Circle, Division, `Sub-Division`, Feeder FROM meter_data", conn
-            )
         return {
-            'circles': ["All"] + sorted(df['Circle'].dropna().unique().tolist()),
-            'divisions': ["All"] + sorted(df['Division'].dropna().unique().tolist()),
-            'subdivisions': ["All"] + sorted(df['Sub-Division'].dropna().unique().tolist()),
-            'feeders': ["All"] + sorted(df['Feeder'].dropna().unique().tolist())
+            'circles': filter_options({}, 'circle'),
+            'divisions': filter_options({}, 'division'),
+            'subdivisions': filter_options({}, 'subdivision'),
+            'feeders': filter_options({}, 'feeder')
         }
     except:
         return {'circles': ["All"], 'divisions': ["All"], 'subdivisions': ["All"], 'feeders': ["All"]}
 
+def option_index(options, value):
+    # Unset access levels read back as None or NaN and mean "All"
+    if not isinstance(value, str) or not value:
+        return 0
+    return options.index(value)
+
 # Tabs
 tab1, tab2, tab3, tab4 = st.tabs(["👥 User Management", "🛠️ Mute Reason Editor", "📥 Data Import", "📤 Data Export"])
 
@@ -65,7 +78,7 @@ with tab1:
                 else:
                     try:
                         hashed = hash_password(password)
-                        with sqlite3.connect("sepco_meters.db") as conn:
+                        with writer() as conn:
                             conn.execute("""
                                 INSERT INTO users (email, password, role, circle, division, subdivision, feeder)
                                 VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -76,7 +89,6 @@ with tab1:
                                 None if subdivision == "All" else subdivision,
                                 None if feeder == "All" else feeder
                             ))
-                            conn.commit()
                         st.success("✅ User added")
                         st.rerun()
                     except sqlite3.IntegrityError:
@@ -87,7 +99,7 @@ with tab1:
     # View/Edit/Delete
     with st.expander("📋 View/Edit/Delete Users", expanded=True):
         try:
-            with sqlite3.connect("sepco_meters.db") as conn:
+            with reader() as conn:
                 df = pd.read_sql_query(
                     "SELECT id, email, role, circle, division, subdivision, feeder FROM users", conn
                 )
@@ -104,17 +116,17 @@ with tab1:
                     filters = load_filter_options()
                     col1, col2 = st.columns(2)
                     with col1:
-                        new_circle = st.selectbox("Circle", filters['circles'], index=filters['circles'].index(user['circle'] or "All"))
-                        new_division = st.selectbox("Division", filters['divisions'], index=filters['divisions'].index(user['division'] or "All"))
+                        new_circle = st.selectbox("Circle", filters['circles'], index=option_index(filters['circles'], user['circle']))
+                        new_division = st.selectbox("Division", filters['divisions'], index=option_index(filters['divisions'], user['division']))
                     with col2:
-                        new_subdivision = st.selectbox("Sub-Division", filters['subdivisions'], index=filters['subdivisions'].index(user['subdivision'] or "All"))
-                        new_feeder = st.selectbox("Feeder", filters['feeders'], index=filters['feeders'].index(user['feeder'] or "All"))
+                        new_subdivision = st.selectbox("Sub-Division", filters['subdivisions'], index=option_index(filters['subdivisions'], user['subdivision']))
+                        new_feeder = st.selectbox("Feeder", filters['feeders'], index=option_index(filters['feeders'], user['feeder']))
 
                     col1, col2 = st.columns(2)
                     with col1:
                         if st.form_submit_button("Update User"):
                             try:
-                                with sqlite3.connect("sepco_meters.db") as conn:
+                                with writer() as conn:
                                     if new_password:
                                         hashed = hash_password(new_password)
                                         conn.execute("""
@@ -140,7 +152,6 @@ with tab1:
                                             None if new_feeder == "All" else new_feeder,
                                             int(user['id'])
                                         ))
-                                    conn.commit()
                                 st.success("✅ User updated")
                                 st.rerun()
                             except Exception as e:
@@ -149,9 +160,8 @@ with tab1:
                     with col2:
                         if st.form_submit_button("Delete User"):
                             try:
-                                with sqlite3.connect("sepco_meters.db") as conn:
+                                with writer() as conn:
                                     conn.execute("DELETE FROM users WHERE id = ?", (int(user['id']),))
-                                    conn.commit()
                                 st.success("✅ User deleted")
                                 st.rerun()
                             except Exception as e:
@@ -173,7 +183,7 @@ with tab2:
         
         if ref_input:
             try:
-                with sqlite3.connect("sepco_meters.db") as conn:
+                with reader() as conn:
                     cursor = conn.cursor()
                     query = """SELECT Reference_no, Name, mute_reason 
                                FROM meter_data 
@@ -192,18 +202,77 @@ with tab2:
                     
                     if st.button("Update Mute Reason"):
                         updated_value = None if new_reason.strip() == "" else new_reason.strip()
-                        with sqlite3.connect("sepco_meters.db") as conn:
+                        with writer() as conn:
                             conn.execute(
                                 "UPDATE meter_data SET mute_reason = ? WHERE Reference_no = ?",
                                 (updated_value, ref_input.strip())
                             )
-                            conn.commit()
                         st.success("✅ Mute reason updated successfully")
                         st.rerun()
                 else:
                     st.error("❌ Reference Number not found")
             except Exception as e:
                 st.error(f"❌ Error updating mute reason: {str(e)}")
+    
+    with st.expander("📦 Bulk Mute Reason Assignment"):
+        bulk_target = st.radio(
+            "Select meters by:",
+            ["Hierarchy filter", "Reference list"],
+            horizontal=True,
+            key="bulk_target"
+        )
+        
+        bulk_scope, bulk_refs = {}, None
+        try:
+            if bulk_target == "Hierarchy filter":
+                col1, col2 = st.columns(2)
+                with col1:
+                    circle = st.selectbox("Circle:", filter_options(bulk_scope, 'circle'), key="bulk_circle")
+                    bulk_scope = narrow_scope(bulk_scope, circle=circle)
+                    division = st.selectbox("Division:", filter_options(bulk_scope, 'division'), key="bulk_division")
+                    bulk_scope = narrow_scope(bulk_scope, division=division)
+                with col2:
+                    subdiv = st.selectbox("Sub-Division:", filter_options(bulk_scope, 'subdivision'), key="bulk_subdivision")
+                    bulk_scope = narrow_scope(bulk_scope, subdivision=subdiv)
+                    feeder = st.selectbox("Feeder:", filter_options(bulk_scope, 'feeder'), key="bulk_feeder")
+                    bulk_scope = narrow_scope(bulk_scope, feeder=feeder)
+            else:
+                bulk_file = st.file_uploader(
+                    "Upload CSV or Excel file of reference numbers",
+                    type=["csv", "xlsx"],
+                    help="Uses the Reference_no column, or the first column if there is none",
+                    key="bulk_file"
+                )
+                if bulk_file is not None:
+                    bulk_refs = unique_references(references_from_upload(bulk_file))
+                    st.caption(f"{len(bulk_refs):,} reference numbers in file")
+        except Exception as e:
+            st.error(f"❌ Error reading selection: {str(e)}")
+            bulk_target = None
+        
+        bulk_reason = st.selectbox("Mute Reason:", MUTE_REASONS, key="bulk_reason")
+        only_blank = st.checkbox("Only meters without a mute reason", value=True, key="bulk_only_blank")
+        
+        if bulk_target == "Reference list" and bulk_refs is None:
+            st.info("ℹ️ Upload a file of reference numbers")
+        elif bulk_target == "Reference list" and len(bulk_refs) > BULK_LIMIT:
+            st.error(f"❌ At most {BULK_LIMIT:,} reference numbers per upload")
+        elif bulk_target == "Hierarchy filter" and not bulk_scope:
+            st.info("ℹ️ Select at least a Circle to assign a reason in bulk")
+        elif bulk_target is not None:
+            try:
+                matched = target_count(bulk_scope, bulk_refs, only_blank)
+                st.write(f"**{matched:,}** meters will be set to **{bulk_reason}**")
+                if matched and st.button("Assign Mute Reason", key="bulk_assign"):
+                    bar = st.progress(0.0, text="Updating meters…")
+                    updated = assign_reason(
+                        bulk_reason, bulk_scope, refs=bulk_refs, only_blank=only_blank,
+                        progress=lambda done, total: bar.progress(done / total, text=f"Updating meters… {done:,}/{total:,}")
+                    )
+                    bar.empty()
+                    st.success(f"✅ Mute reason set on {updated:,} meters")
+            except Exception as e:
+                st.error(f"❌ Error assigning mute reason: {str(e)}")
 
 with tab3:
     # Data Import Section
@@ -216,104 +285,111 @@ with tab3:
             help="File must contain required columns"
         )
         
-        if uploaded_file:
+        # Each upload is imported once, when the Import button is pressed;
+        # mode and snapshot date are chosen first and fixed once it succeeded
+        import_results = st.session_state.setdefault('import_results', {})
+        result = import_results.get(uploaded_file.file_id) if uploaded_file else None
+        imported = result is not None and 'error' not in result
+        
+        import_mode = st.radio(
+            "Import mode",
+            list(IMPORT_MODES),
+            format_func=IMPORT_MODES.get,
+            horizontal=True,
+            disabled=imported,
+            help="Merge updates records whose data changed; mute reasons entered in the field are always kept"
+        )
+        
+        snapshot_day = None
+        if import_mode == 'snapshot':
+            snapshot_day = st.date_input(
+                "Snapshot date",
+                value=pd.Timestamp.now().date(),
+                disabled=imported,
+                help="A load captured again for the same date replaces the earlier one"
+            )
+        
+        if uploaded_file and not imported and st.button("Import", key="run_import", type="primary"):
+            progress_text = st.empty()
             try:
-                # Read uploaded file
-                if uploaded_file.name.endswith('.csv'):
-                    new_data = pd.read_csv(uploaded_file, dtype={'Reference_no': str})
-                else:
-                    new_data = pd.read_excel(uploaded_file, dtype={'Reference_no': str})
-                
-                # Clean data
-                new_data['Reference_no'] = new_data['Reference_no'].astype(str).str.strip()
-                
-                # Check required columns
-                required_columns = {
-                    "Reference_no", "Name", "Circle", "Division", "Sub-Division",
-                    "Feeder", "Latitude", "Longitude", "mute_reason"
-                }
-                if not required_columns.issubset(new_data.columns):
-                    missing = required_columns - set(new_data.columns)
-                    st.error(f"❌ Missing required columns: {', '.join(missing)}")
+                result = import_meter_data(
+                    uploaded_file,
+                    mode=import_mode,
+                    snapshot_day=snapshot_day,
+                    progress=lambda rows: progress_text.caption(f"⏳ {rows:,} rows processed…")
+                )
+                result.update(mode=import_mode, snapshot_day=snapshot_day)
+            except ValueError as e:
+                result = {'error': f"❌ {str(e)}"}
+            except Exception as e:
+                result = {'error': f"❌ Error during import: {str(e)}"}
+            progress_text.empty()
+            import_results[uploaded_file.file_id] = result
+        
+        if result is not None:
+            if 'error' in result:
+                st.error(result['error'])
+            elif result['mode'] in ('merge', 'snapshot'):
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Inserted", result['inserted'])
+                col2.metric("Updated", result['updated'])
+                col3.metric("Unchanged", result['unchanged'])
+                if result['mode'] == 'snapshot':
+                    st.success(f"✅ Stored {result['snapshot_rows']:,} meters as the {result['snapshot_day']:%d %b %Y} snapshot")
+            else:
+                if result['inserted']:
+                    st.success(f"✅ Imported {result['inserted']} new records")
                 else:
-                    # Check for duplicates
-                    with sqlite3.connect("sepco_meters.db") as conn:
-                        existing_refs = pd.read_sql_query(
-                            "SELECT Reference_no FROM meter_data", 
-                            conn
-                        )
-                    
-                    existing_ref_set = set(existing_refs['Reference_no'].astype(str).str.strip())
-                    new_unique_rows = new_data[~new_data['Reference_no'].isin(existing_ref_set)]
-                    
-                    if not new_unique_rows.empty:
-                        with sqlite3.connect("sepco_meters.db") as conn:
-                            new_unique_rows.to_sql(
-                                "meter_data", 
-                                conn, 
-                                if_exists='append', 
-                                index=False
-                            )
-                            conn.commit()
-                        st.success(f"✅ Imported {len(new_unique_rows)} new records")
-                    else:
-                        st.info("ℹ️ No new records to import. All Reference Numbers already exist")
-                    
-                    st.warning(f"⚠️ Skipped {len(new_data) - len(new_unique_rows)} duplicate rows")
+                    st.info("ℹ️ No new records to import. All Reference Numbers already exist")
                 
-            except Exception as e:
-                st.error(f"❌ Error during import: {str(e)}")
+                st.warning(f"⚠️ Skipped {result['skipped']} duplicate rows")
+            
+            if 'error' not in result:
+                if result['ignored_columns']:
+                    st.info(f"ℹ️ Ignored unknown columns: {', '.join(result['ignored_columns'])}")
 
 with tab4:
     # Data Export Section
     st.subheader("Data Export")
     
     try:
-        with sqlite3.connect("sepco_meters.db") as conn:
-            full_df = pd.read_sql_query("SELECT * FROM meter_data", conn)
+        scope = {}
         
-        # Filter options in columns
+        # Filter options in columns (each selection narrows the next)
         with st.expander("🔍 Filter Options", expanded=True):
             col1, col2 = st.columns(2)
             with col1:
                 circle = st.selectbox(
                     "Select Circle:", 
-                    ["All"] + sorted(full_df['Circle'].dropna().unique().tolist()),
+                    filter_options(scope, 'circle'),
                     key="export_circle"
                 )
+                scope = narrow_scope(scope, circle=circle)
                 division = st.selectbox(
                     "Select Division:", 
-                    ["All"] + sorted(full_df['Division'].dropna().unique().tolist()),
+                    filter_options(scope, 'division'),
                     key="export_division"
                 )
+                scope = narrow_scope(scope, division=division)
             with col2:
                 subdiv = st.selectbox(
                     "Select Sub-Division:", 
-                    ["All"] + sorted(full_df['Sub-Division'].dropna().unique().tolist()),
+                    filter_options(scope, 'subdivision'),
                     key="export_subdivision"
                 )
+                scope = narrow_scope(scope, subdivision=subdiv)
                 feeder = st.selectbox(
                     "Select Feeder:", 
-                    ["All"] + sorted(full_df['Feeder'].dropna().unique().tolist()),
+                    filter_options(scope, 'feeder'),
                     key="export_feeder"
                 )
+                scope = narrow_scope(scope, feeder=feeder)
         
         # Apply filters
-        filtered_df = full_df.copy()
-        if circle != "All":
-            filtered_df = filtered_df[filtered_df['Circle'] == circle]
-        if division != "All":
-            filtered_df = filtered_df[filtered_df['Division'] == division]
-        if subdiv != "All":
-            filtered_df = filtered_df[filtered_df['Sub-Division'] == subdiv]
-        if feeder != "All":
-            filtered_df = filtered_df[filtered_df['Feeder'] == feeder]
+        filtered_df = get_store().frame(scope)
         
         # Filter mute meters only
-        mute_df = filtered_df[
-            filtered_df['mute_reason'].notnull() & 
-            (filtered_df['mute_reason'].str.strip() != '')
-        ]
+        mute_df = filtered_df[is_mute(filtered_df)]
         
         if mute_df.empty:
             st.info("ℹ️ No mute meter records found for the selected filters")
@@ -322,39 +398,19 @@ with tab4:
             
             # Preview data in separate expander
             with st.expander("📋 Preview Data", expanded=False):
+                # Only the first rows are sent to the browser; exports have them all
+                preview = preview_rows(*export_query(scope, mute_only=True))
+                if len(preview) < len(mute_df):
+                    st.caption(f"Showing the first {len(preview):,} of {len(mute_df):,} records")
                 st.dataframe(
-                    mute_df,
+                    preview,
                     use_container_width=True,
                     height=300
                 )
             
-            # Export options section
+            # Export options: built in the background and cached until the data changes
             st.markdown("### 📤 Export Options")
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Excel export
-                excel_buffer = BytesIO()
-                mute_df.to_excel(excel_buffer, index=False)
-                st.download_button(
-                    label="💾 Download Excel",
-                    data=excel_buffer.getvalue(),
-                    file_name="sepco_mute_data.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True
-                )
-            
-            with col2:
-                # CSV export
-                csv_buffer = BytesIO()
-                mute_df.to_csv(csv_buffer, index=False)
-                st.download_button(
-                    label="📄 Download CSV",
-                    data=csv_buffer.getvalue(),
-                    file_name="sepco_mute_data.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
+            export_panel(scope, True, ['xlsx', 'csv'], "sepco_mute_data", "admin_export")
             
             # Delete section with confirmation
             st.markdown("---")
@@ -375,16 +431,14 @@ with tab4:
                         use_container_width=True
                     ):
                         try:
-                            with sqlite3.connect("sepco_meters.db") as conn:
-                                cursor = conn.cursor()
-                                ref_list = mute_df['Reference_no'].astype(str).tolist()
-                                if ref_list:
+                            ref_list = mute_df['Reference_no'].astype(str).tolist()
+                            if ref_list:
+                                with writer() as conn:
                                     query = f"""DELETE FROM meter_data 
                                               WHERE Reference_no IN ({','.join(['?']*len(ref_list))})"""
-                                    cursor.execute(query, ref_list)
-                                    conn.commit()
-                                    st.success(f"✅ Deleted {len(ref_list)} records successfully")
-                                    st.rerun()
+                                    conn.execute(query, ref_list)
+                                st.success(f"✅ Deleted {len(ref_list)} records successfully")
+                                st.rerun()
                         except Exception as e:
                             st.error(f"❌ Error deleting records: {str(e)}")
     
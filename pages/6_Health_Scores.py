@@ -0,0 +1,147 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from helpers.navigation import setup_navigation
+from helpers.auth import check_authentication
+from helpers.queries import access_scope, narrow_scope
+from helpers.hierarchy import filter_options
+from helpers.store import data_version
+from helpers.health import (
+    FULL_OVERLOAD, MUTE_WEIGHT, OVERLOAD_WEIGHT,
+    get_health_job, health_scores, run_health_scores, scores_version
+)
+
+# 1. Page config (must be first)
+st.set_page_config(
+    page_title="SEPCO Dashboard - Health Scores",
+    layout="wide"
+)
+
+# 2. Authentication check
+check_authentication()
+
+# 3. Setup custom navigation (hides auto sidebar)
+setup_navigation()
+
+# 4. Set current page
+st.session_state.current_page = "Health Scores"
+
+# Page content
+st.title("🩺 Feeder & Transformer Health")
+
+# Scores are kept current by a background job; make sure it is running
+job = get_health_job()
+
+scope = access_scope()
+
+# Sidebar filters (each selection narrows the scope the next one lists)
+with st.sidebar:
+    st.header("🔍 Filter Options")
+    
+    circle = st.selectbox("Select Circle:", filter_options(scope, 'circle'))
+    scope = narrow_scope(scope, circle=circle)
+    
+    division = st.selectbox("Select Division:", filter_options(scope, 'division'))
+    scope = narrow_scope(scope, division=division)
+    
+    subdiv = st.selectbox("Select Sub-Division:", filter_options(scope, 'subdivision'))
+    scope = narrow_scope(scope, subdivision=subdiv)
+    
+    feeder = st.selectbox("Select Feeder:", filter_options(scope, 'feeder'))
+    scope = narrow_scope(scope, feeder=feeder)
+
+scored_version, computed_at = scores_version()
+if scored_version is None:
+    # First visit after installing: score now rather than wait for the job
+    with st.spinner("Computing health scores…"):
+        run_health_scores()
+    scored_version, computed_at = scores_version()
+
+col1, col2 = st.columns([3, 1])
+with col1:
+    status = f"Scores computed {computed_at}"
+    if scored_version != data_version():
+        status += " · data has changed since; the next scheduled run will refresh them"
+    st.caption(status)
+    if job.last_error is not None:
+        st.warning(f"⚠️ Last scheduled run failed: {job.last_error}")
+with col2:
+    if st.session_state.user_role == "admin" and st.button("🔄 Recompute Now"):
+        with st.spinner("Computing health scores…"):
+            run_health_scores()
+        st.rerun()
+
+with st.expander("ℹ️ How the score is computed"):
+    st.markdown(
+        f"- **Mute ratio**: mute meters / meters\n"
+        f"- **Load ratio**: sanctioned load (kW) / transformer capacity (kVA); "
+        f"a feeder's capacity is the sum of its transformers'\n"
+        f"- **Score** (0–100, higher is worse) = {MUTE_WEIGHT * 100:.0f} × mute ratio + "
+        f"{OVERLOAD_WEIGHT * 100:.0f} × overload, where overload rises from 0 at 100% "
+        f"to 1 at {FULL_OVERLOAD * 100:.0f}% of capacity"
+    )
+
+level = st.radio("Rank:", ["transformer", "feeder"], format_func=lambda l: f"{l.title()}s", horizontal=True)
+top_n = st.slider("Show top:", 10, 500, 50, step=10)
+
+try:
+    scores = health_scores(scope, level)
+except Exception as e:
+    st.error(f"⚠️ Failed to load health scores: {str(e)}")
+    st.stop()
+
+if scores.empty:
+    st.warning("No health scores available for selected filters.")
+    st.stop()
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric(f"{level.title()}s", f"{len(scores):,}")
+col2.metric("Above 50% Mute", f"{(scores['mute_ratio'] > 0.5).sum():,}")
+col3.metric("Overloaded", f"{(scores['load_ratio'] > 1).sum():,}")
+col4.metric("Worst Score", f"{scores['score'].iloc[0]:.1f}")
+
+ranked = scores.head(top_n)
+name_columns = ['Sub-Division', 'Feeder', 'Transformer'] if level == 'transformer' else ['Division', 'Sub-Division', 'Feeder']
+ranked = ranked.assign(Name=ranked[name_columns].astype(str).agg(" / ".join, axis=1))
+
+fig_rank = px.bar(
+    ranked.head(20).iloc[::-1],
+    x='score',
+    y='Name',
+    orientation='h',
+    color='mute_ratio',
+    color_continuous_scale='Reds',
+    hover_data=['meters', 'mute', 'load_ratio', 'top_reason'],
+    title=f"Top {min(20, len(ranked))} {level.title()}s by Score",
+    height=550
+)
+fig_rank.update_layout(xaxis_title="Score", yaxis_title="", coloraxis_colorbar_title="Mute Ratio")
+st.plotly_chart(fig_rank, use_container_width=True)
+
+st.subheader(f"📋 Ranked {level.title()}s")
+st.dataframe(
+    ranked[['Circle', 'Division', 'Sub-Division', 'Feeder', 'Transformer', 'score', 'meters', 'mute',
+            'mute_ratio', 'sanctioned_kw', 'capacity_kva', 'load_ratio', 'reason_mix']]
+    .drop(columns=[] if level == 'transformer' else ['Transformer']),
+    use_container_width=True,
+    hide_index=True,
+    height=500,
+    column_config={
+        'score': st.column_config.ProgressColumn("Score", min_value=0, max_value=100, format="%.1f"),
+        'meters': st.column_config.NumberColumn("Meters"),
+        'mute': st.column_config.NumberColumn("Mute"),
+        'mute_ratio': st.column_config.ProgressColumn("Mute Ratio", min_value=0, max_value=1, format="percent"),
+        'sanctioned_kw': st.column_config.NumberColumn("Sanctioned (kW)", format="%.0f"),
+        'capacity_kva': st.column_config.NumberColumn("Capacity (kVA)", format="%.0f"),
+        'load_ratio': st.column_config.NumberColumn("Load / Capacity", format="percent"),
+        'reason_mix': st.column_config.TextColumn("Reason Mix"),
+    }
+)
+
+# Download button for the ranking (built only when clicked)
+st.sidebar.download_button(
+    label="📥 Download Health Scores",
+    data=lambda: scores.to_csv(index=False).encode('utf-8'),
+    file_name=f"health_scores_{level}_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
+    mime='text/csv'
+)
@@ -0,0 +1,46 @@
+import os
+import shutil
+import sys
+
+import pytest
+import streamlit as st
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from helpers import db  # noqa: E402
+
+SHIPPED_DB = os.path.join(ROOT, "sepco_meters.db")
+
+
+def _close_connections():
+    # Connections still leased by other threads are closed when they end
+    db._reader_generation += 1
+    db._local.lease = None
+    with db._idle_lock:
+        for conn in db._idle_readers:
+            conn.close()
+        db._idle_readers.clear()
+    if db._write_conn is not None:
+        db._write_conn.close()
+        db._write_conn = None
+
+
+@pytest.fixture
+def raw_db(tmp_path, monkeypatch):
+    """Path of an unmigrated copy of the shipped database, in a fresh cwd"""
+    shutil.copy(SHIPPED_DB, tmp_path / "sepco_meters.db")
+    monkeypatch.chdir(tmp_path)
+    _close_connections()
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    yield tmp_path / "sepco_meters.db"
+    _close_connections()
+
+
+@pytest.fixture
+def meter_db(raw_db):
+    """Migrated copy of the shipped database"""
+    from helpers.migrations import ensure_schema
+    ensure_schema(db.DB_PATH)
+    return raw_db
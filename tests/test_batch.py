@@ -0,0 +1,23 @@
+import pytest
+
+from helpers.batch import resolve_references, target_count
+from helpers.db import reader
+
+
+def test_resolve_keeps_input_order(meter_db):
+    refs = [ref for (ref,) in reader().execute("SELECT Reference_no FROM meter_data LIMIT 3")]
+    found, missing, restricted = resolve_references(refs[::-1] + ["NO-SUCH-REF"], {})
+    assert found['Reference_no'].tolist() == refs[::-1]
+    assert missing == ["NO-SUCH-REF"]
+    assert restricted == []
+    assert not reader().in_transaction
+
+
+def test_failed_staging_leaves_reader_idle(meter_db):
+    refs = [ref for (ref,) in reader().execute("SELECT Reference_no FROM meter_data LIMIT 3")]
+    with pytest.raises(Exception):
+        # The fourth value cannot be bound, after three rows were staged
+        resolve_references(refs + [object()], {})
+    assert not reader().in_transaction
+    assert reader().execute("SELECT COUNT(*) FROM temp.batch_refs").fetchone()[0] == 0
+    assert target_count({}, refs, only_blank=False) == 3
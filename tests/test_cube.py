@@ -0,0 +1,43 @@
+import pandas as pd
+
+from helpers.cube import MEASURES, UNKNOWN, rollup, slice_cube, tariff_cube
+from helpers.store import get_store
+
+CUBE = pd.DataFrame({
+    'Tariff': ["A1", "A1", "B2", "B2", UNKNOWN],
+    'Division': ["DIV-1", "DIV-2", "DIV-1", "DIV-1", "DIV-2"],
+    'Load Band': ["0–1 kW", "1–2 kW", "0–1 kW", "5–10 kW", "0–1 kW"],
+    'Meter Type': ["3-PH", "3-PH", "1-PH", "3-PH", "1-PH"],
+    'Meters': [4, 1, 2, 3, 5],
+    'Sanction Load (kW)': [2.0, 1.5, 1.0, 24.0, 0.0],
+})
+
+
+def test_slice_and_rollup():
+    div_1 = slice_cube(CUBE, {'Division': "DIV-1"})
+    assert div_1['Meters'].tolist() == [4, 2, 3]
+    assert slice_cube(CUBE, {'Division': "DIV-1", 'Tariff': "B2", 'Meter Type': "1-PH"})['Meters'].tolist() == [2]
+
+    by_tariff = rollup(CUBE, ['Tariff'])
+    assert by_tariff.set_index('Tariff').to_dict('index') == {
+        "A1": {'Meters': 5, 'Sanction Load (kW)': 3.5},
+        "B2": {'Meters': 5, 'Sanction Load (kW)': 25.0},
+        UNKNOWN: {'Meters': 5, 'Sanction Load (kW)': 0.0},
+    }
+    assert rollup(div_1, ['Tariff', 'Meter Type'])['Meters'].tolist() == [4, 3, 2]
+    total = rollup(CUBE, [])
+    assert total[MEASURES].values.tolist() == [[15, 28.5]]
+
+
+def test_cube_matches_the_meter_frame(meter_db):
+    cube = tariff_cube({})
+    df = get_store().frame()
+    assert cube['Meters'].sum() == len(df)
+    assert abs(cube['Sanction Load (kW)'].sum() - df['Sanction Load'].fillna(0).sum()) < 1e-6 * len(df)
+
+    tariffs = df['Tariff'].astype(object).fillna('').astype(str).str.strip().replace('', UNKNOWN)
+    by_tariff = rollup(cube, ['Tariff']).set_index('Tariff')['Meters']
+    assert by_tariff.sort_index().to_dict() == tariffs.value_counts().sort_index().to_dict()
+
+    division = df['Division'].dropna().iloc[0]
+    assert slice_cube(cube, {'Division': division})['Meters'].sum() == (df['Division'] == division).sum()
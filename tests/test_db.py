@@ -0,0 +1,30 @@
+import threading
+
+from helpers.db import reader
+
+
+def _in_thread(target):
+    # Like a Streamlit rerun: a fresh thread that ends when the script does
+    result = []
+    thread = threading.Thread(target=lambda: result.append(target()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_reader_is_reused_by_the_next_thread(meter_db):
+    first = _in_thread(reader)
+    assert _in_thread(reader) is first
+    assert reader() is first
+    assert _in_thread(reader) is not first
+
+
+def test_returned_reader_is_idle(meter_db):
+    def leave_open():
+        conn = reader()
+        conn.execute("BEGIN")
+        conn.execute("SELECT COUNT(*) FROM meter_data").fetchone()
+        return conn
+    conn = _in_thread(leave_open)
+    assert _in_thread(reader) is conn
+    assert not conn.in_transaction
@@ -0,0 +1,45 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.export_jobs import ExportJobQueue, _artifact_reader
+
+
+def _wait(job, timeout=30):
+    deadline = time.time() + timeout
+    while job.state not in ('done', 'failed') and time.time() < deadline:
+        time.sleep(0.05)
+    return job.state
+
+
+def test_concurrent_submits_share_one_job(meter_db, tmp_path):
+    jobs = ExportJobQueue(cache_dir=str(tmp_path / "exports"))
+    with ThreadPoolExecutor(8) as pool:
+        submitted = list(pool.map(lambda _: jobs.submit({}, True, 'csv'), range(8)))
+    assert len({id(job) for job in submitted}) == 1
+    assert _wait(submitted[0]) == 'done'
+    assert jobs.submit({}, True, 'csv') is submitted[0]
+
+
+def test_pruned_artifact_can_be_prepared_again(meter_db, tmp_path):
+    jobs = ExportJobQueue(cache_dir=str(tmp_path / "exports"))
+    job = jobs.submit({}, False, 'ndjson')
+    assert _wait(job) == 'done'
+    assert _artifact_reader(job.path)().count(b"\n") == 6099
+
+    os.remove(job.path)
+    jobs.discard(job)
+    assert jobs.get({}, False, 'ndjson') is None
+    assert jobs.submit({}, False, 'ndjson') is not job
+
+
+def test_failed_prune_keeps_the_export_done(meter_db, tmp_path, monkeypatch):
+    jobs = ExportJobQueue(cache_dir=str(tmp_path / "exports"))
+
+    def prune():
+        raise PermissionError("cache directory is read-only")
+    monkeypatch.setattr(jobs, '_prune', prune)
+
+    job = jobs.submit({}, True, 'csv')
+    assert _wait(job) == 'done'
+    assert os.path.exists(job.path)
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from helpers.health import compute_health_scores
+
+PLACE = {'Circle': "C1", 'Division': "D1", 'Sub-Division': "S1", 'Feeder': "F1"}
+
+
+def _meters():
+    rows = [
+        # T1: one real reason; blank, whitespace and NULL reasons are not mute
+        ("T1", 10, 25, "Meter Burnt"),
+        ("T1", 10, 25, "  "),
+        ("T1", 10, 25, ""),
+        ("T1", 10, 25, None),
+        # T2: both mute, same reason once trimmed
+        ("T2", 5, 20, "Wash Out"),
+        ("T2", 5, 20, " Wash Out "),
+    ]
+    df = pd.DataFrame(rows, columns=['Transformer', 'Sanction Load', 'Transformer Capacity', 'mute_reason'])
+    return df.assign(**PLACE)
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_scores_on_known_frame(categorical):
+    df = _meters()
+    if categorical:
+        for column in ['mute_reason', 'Transformer', *PLACE]:
+            df[column] = df[column].astype('category')
+    scores = compute_health_scores(df).set_index(['level', 'Transformer'])
+
+    t1 = scores.loc[('transformer', "T1")]
+    assert (t1['meters'], t1['mute']) == (4, 1)
+    assert t1['load_ratio'] == pytest.approx(40 / 25)
+    # 0.6 x 1/4 mute + 0.4 x (1.6 - 1) overload
+    assert t1['score'] == pytest.approx(39.0)
+    assert (t1['top_reason'], t1['reason_mix']) == ("Meter Burnt", "Meter Burnt (1)")
+
+    t2 = scores.loc[('transformer', "T2")]
+    assert (t2['meters'], t2['mute'], t2['score']) == (2, 2, pytest.approx(60.0))
+    assert t2['reason_mix'] == "Wash Out (2)"
+
+    feeder = scores.loc[('feeder', "")]
+    assert (feeder['meters'], feeder['mute'], feeder['capacity_kva']) == (6, 3, 45)
+    assert feeder['score'] == pytest.approx(100 * (0.6 * 0.5 + 0.4 * (50 / 45 - 1)))
+    assert feeder['reason_mix'] == "Wash Out (2), Meter Burnt (1)"
+
+
+def test_scores_without_mute_meters():
+    df = _meters().assign(mute_reason="")
+    scores = compute_health_scores(df)
+    assert scores['mute'].sum() == 0
+    assert scores['top_reason'].isna().all()
+
+
+def test_mute_totals_match_sql(meter_db):
+    from helpers.db import reader
+    from helpers.queries import MUTE_CONDITION
+    from helpers.store import get_store
+
+    scores = compute_health_scores(get_store().frame())
+    expected = reader().execute(
+        f'SELECT COUNT(*) FROM meter_data WHERE {MUTE_CONDITION}'
+    ).fetchone()[0]
+    for level in ('transformer', 'feeder'):
+        assert scores.loc[scores['level'] == level, 'mute'].sum() == expected
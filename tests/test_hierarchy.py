@@ -0,0 +1,31 @@
+from helpers.batch import assign_reason
+from helpers.db import reader, writer
+from helpers.hierarchy import hierarchy, hierarchy_version
+from helpers.store import data_version
+
+
+def _first_meter():
+    return reader().execute(
+        'SELECT Reference_no, Circle, Division, "Sub-Division" FROM meter_data LIMIT 1'
+    ).fetchone()
+
+
+def test_reason_edits_keep_the_tree(meter_db):
+    tree = hierarchy()
+    ref = _first_meter()[0]
+    assign_reason("Meter Burnt", {}, [ref], only_blank=False)
+    assert data_version() > hierarchy_version()
+    assert hierarchy() is tree
+
+
+def test_rehomed_meter_rebuilds_the_tree(meter_db):
+    tree = hierarchy()
+    ref, circle, division, subdivision = _first_meter()
+    with writer() as conn:
+        conn.execute("UPDATE meter_data SET Feeder = 'NEW FEEDER' WHERE Reference_no = ?", (ref,))
+    assert hierarchy_version() == data_version()
+    rebuilt = hierarchy()
+    assert rebuilt is not tree
+    scope = {'circle': circle, 'division': division, 'subdivision': subdivision}
+    assert 'NEW FEEDER' in rebuilt.options(scope, 'feeder')
+    assert rebuilt.count(dict(scope, feeder='NEW FEEDER')) == 1
@@ -0,0 +1,141 @@
+import datetime
+import io
+
+import pandas as pd
+import pytest
+
+from helpers.db import reader
+from helpers.importer import import_meter_data
+from helpers.partitions import diff_counts, diff_meters, snapshot_days
+from helpers.store import data_version
+
+DAY_1 = datetime.date(2026, 3, 30)
+DAY_2 = datetime.date(2026, 4, 2)
+
+
+def _meters(limit=5):
+    return pd.read_sql_query(
+        f'SELECT * FROM meter_data ORDER BY rowid LIMIT {limit}', reader()
+    )
+
+
+def _upload(df, name="upload.csv"):
+    buf = io.BytesIO(df.to_csv(index=False).encode("utf-8"))
+    buf.name = name
+    return buf
+
+
+def _row(ref):
+    return reader().execute(
+        "SELECT Name, mute_reason FROM meter_data WHERE Reference_no = ?", (ref,)
+    ).fetchone()
+
+
+def test_append_inserts_only_new_references(meter_db):
+    df = _meters(3)
+    df.loc[0, 'Name'] = "CHANGED"
+    new = df.iloc[[1]].assign(Reference_no="NEW-1")
+    before = data_version()
+
+    stats = import_meter_data(_upload(pd.concat([df, new])), mode='append')
+
+    assert (stats['rows'], stats['inserted'], stats['skipped']) == (4, 1, 3)
+    assert _row(df.loc[0, 'Reference_no'])[0] != "CHANGED"
+    assert _row("NEW-1") is not None
+    assert data_version() == before + 1
+
+
+def test_merge_updates_changed_rows_but_keeps_reasons(meter_db):
+    df = _meters(3)
+    ref = df.loc[0, 'Reference_no']
+    reason = _row(ref)[1]
+    df.loc[0, 'Name'] = "CHANGED"
+    df.loc[0, 'mute_reason'] = "Meter Burnt"
+
+    stats = import_meter_data(_upload(df), mode='merge')
+
+    assert (stats['updated'], stats['unchanged']) == (1, 2)
+    assert _row(ref) == ("CHANGED", reason)
+
+
+def test_missing_columns_rejected(meter_db):
+    with pytest.raises(ValueError, match="Feeder"):
+        import_meter_data(_upload(_meters(2).drop(columns=['Feeder'])), mode='merge')
+
+
+def test_snapshot_stores_the_upload_with_its_own_reasons(meter_db):
+    df = _meters(4)
+    a, b, c, d = df['Reference_no']
+    day_1 = df.assign(mute_reason=["Meter Burnt", "", "Not Found", ""])
+    # Next day: a restored, b newly mute, c missing from the load, d unchanged
+    day_2 = df.iloc[[0, 1, 3]].assign(mute_reason=["", "Wash Out", ""])
+
+    assert import_meter_data(_upload(day_1), mode='snapshot', snapshot_day=DAY_1)['snapshot_rows'] == 4
+    assert import_meter_data(_upload(day_2), mode='snapshot', snapshot_day=DAY_2)['snapshot_rows'] == 3
+
+    loads = snapshot_days().set_index('Date')
+    assert loads.loc[DAY_1, 'Mute'] == 2 and loads.loc[DAY_2, 'Mute'] == 1
+    assert diff_counts(DAY_1, DAY_2, {}) == {'newly_mute': 1, 'restored': 1, 'still_mute': 0, 'dropped': 1}
+    newly = diff_meters(DAY_1, DAY_2, 'newly_mute', {})
+    assert newly[['Reference_no', 'Reason After']].values.tolist() == [[b, "Wash Out"]]
+    assert diff_meters(DAY_1, DAY_2, 'dropped', {})['Reference_no'].tolist() == [c]
+
+
+def test_failed_snapshot_import_keeps_the_earlier_load(meter_db):
+    df = _meters(3).assign(mute_reason="Meter Burnt")
+    import_meter_data(_upload(df), mode='snapshot', snapshot_day=DAY_1)
+    with pytest.raises(ValueError):
+        import_meter_data(_upload(df.drop(columns=['Circle'])), mode='snapshot', snapshot_day=DAY_1)
+    loads = snapshot_days().set_index('Date')
+    assert loads.loc[DAY_1, 'Meters'] == 3
+
+
+def _dates(ref):
+    return reader().execute(
+        'SELECT "Connection Date" FROM meter_data WHERE Reference_no = ?', (ref,)
+    ).fetchone()[0]
+
+
+def _date_rejects():
+    return reader().execute(
+        "SELECT Reference_no, raw_value FROM date_rejects WHERE column_name = 'Connection Date' "
+        "AND Reference_no LIKE 'NEW-%' ORDER BY Reference_no"
+    ).fetchall()
+
+
+def test_mixed_date_formats_are_read_day_first(meter_db):
+    df = _meters(5).assign(Reference_no=[f"NEW-{i}" for i in range(5)])
+    df['Connection Date'] = ["2021-03-05", "15/03/2021", "March 3, 2021", "05/03/2021", "soon"]
+
+    import_meter_data(_upload(df), mode='append')
+
+    assert [_dates(f"NEW-{i}") for i in range(5)] == [
+        "2021-03-05", "2021-03-15", "2021-03-03", "2021-03-05", None
+    ]
+    assert _date_rejects() == [("NEW-4", "soon")]
+
+
+def test_merge_keeps_stored_dates_it_cannot_read(meter_db):
+    df = _meters(2).assign(Reference_no=["NEW-0", "NEW-1"], **{'Connection Date': "05/03/2021"})
+    import_meter_data(_upload(df), mode='append')
+
+    df['Connection Date'] = ["unknown", "06/03/2021"]
+    stats = import_meter_data(_upload(df), mode='merge')
+
+    assert (stats['updated'], stats['unchanged']) == (1, 1)
+    assert (_dates("NEW-0"), _dates("NEW-1")) == ("2021-03-05", "2021-03-06")
+    assert _date_rejects() == [("NEW-0", "unknown")]
+
+    # Once the file carries a readable date again the reject is cleared
+    df['Connection Date'] = "07/03/2021"
+    import_meter_data(_upload(df), mode='merge')
+    assert _dates("NEW-0") == "2021-03-07" and _date_rejects() == []
+
+
+def test_repeated_header_line_is_not_imported(meter_db):
+    df = _meters(2)
+    header = pd.DataFrame([{c: c for c in df.columns}]).assign(Reference_no="Reference No.")
+    new = df.assign(Reference_no=["NEW-0", "NEW-1"])
+    stats = import_meter_data(_upload(pd.concat([header, new])), mode='merge')
+    assert stats['inserted'] == 2
+    assert _row("Reference No.") is None
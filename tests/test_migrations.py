@@ -0,0 +1,117 @@
+import sqlite3
+
+from helpers.migrations import HEADER_ROW, SCHEMA_VERSION, migrate
+
+
+def _open(path):
+    return sqlite3.connect(path, isolation_level=None)
+
+
+def _meter_row(conn, **values):
+    """Copy of the first meter with some columns replaced, inserted raw"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(meter_data)")]
+    row = dict(zip(columns, conn.execute(f"SELECT * FROM meter_data WHERE NOT ({HEADER_ROW}) LIMIT 1").fetchone()))
+    row.update(values)
+    names = ", ".join(f'"{col}"' for col in row)
+    conn.execute(f"INSERT INTO meter_data ({names}) VALUES ({', '.join('?' * len(row))})", list(row.values()))
+
+
+def test_migrates_shipped_database(raw_db):
+    conn = _open(raw_db)
+    # The shipped file carries the export's header line as a meter
+    assert conn.execute(f"SELECT COUNT(*) FROM meter_data WHERE {HEADER_ROW}").fetchone()[0] == 1
+    before = conn.execute("SELECT COUNT(*) FROM meter_data").fetchone()[0]
+    migrate(conn)
+
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM meter_data").fetchone()[0] == before - 1
+    assert conn.execute("SELECT COUNT(*) FROM date_rejects WHERE Reference_no = 'Reference No.'").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM meter_hashes").fetchone()[0] == before - 1
+    mute = conn.execute(
+        "SELECT COUNT(*) FROM meter_data WHERE TRIM(IFNULL(mute_reason, '')) != ''"
+    ).fetchone()[0]
+    assert conn.execute('SELECT SUM("count") FROM mute_summary').fetchone()[0] == mute
+    assert conn.execute("SELECT COUNT(*) FROM mute_events WHERE kind = 'mute'").fetchone()[0] > 0
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+
+    # A second run finds nothing to do
+    migrate(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+
+
+def test_dedupe_keeps_rows_without_reference(raw_db):
+    conn = _open(raw_db)
+    first = conn.execute(f"SELECT Reference_no FROM meter_data WHERE NOT ({HEADER_ROW}) LIMIT 1").fetchone()[0]
+    _meter_row(conn, Reference_no=first)
+    _meter_row(conn, Reference_no=None)
+    _meter_row(conn, Reference_no=None)
+    before = conn.execute("SELECT COUNT(*) FROM meter_data").fetchone()[0]
+    migrate(conn)
+
+    # The duplicate and the header row are gone
+    assert conn.execute("SELECT COUNT(*) FROM meter_data").fetchone()[0] == before - 2
+    assert conn.execute("SELECT COUNT(*) FROM meter_data WHERE Reference_no IS NULL").fetchone()[0] == 2
+
+
+def test_unparseable_dates_are_kept(raw_db):
+    conn = _open(raw_db)
+    _meter_row(conn, Reference_no="DATE-1", **{"Installation Date": "31/02/20x9"})
+    _meter_row(conn, Reference_no="DATE-2", **{"Installation Date": "2021-03-04 10:00:00"})
+    migrate(conn)
+
+    dates = dict(conn.execute(
+        "SELECT Reference_no, \"Installation Date\" FROM meter_data WHERE Reference_no LIKE 'DATE-%'"
+    ))
+    assert dates == {"DATE-1": None, "DATE-2": "2021-03-04"}
+    rejects = conn.execute("SELECT Reference_no, column_name, raw_value FROM date_rejects").fetchall()
+    assert rejects == [("DATE-1", "Installation Date", "31/02/20x9")]
+
+
+def test_mixed_date_formats_are_read_day_first(raw_db):
+    conn = _open(raw_db)
+    samples = {
+        "MIX-1": "2021-03-05",
+        "MIX-2": "15/03/2021",
+        "MIX-3": "March 3, 2021",
+        "MIX-4": "05/03/2021",
+        "MIX-5": "07-Jan-2020",
+        "MIX-6": "sometime in May",
+    }
+    for ref, value in samples.items():
+        _meter_row(conn, Reference_no=ref, **{"Installation Date": value})
+    migrate(conn)
+
+    dates = dict(conn.execute(
+        "SELECT Reference_no, \"Installation Date\" FROM meter_data WHERE Reference_no LIKE 'MIX-%'"
+    ))
+    assert dates == {
+        "MIX-1": "2021-03-05",
+        "MIX-2": "2021-03-15",
+        "MIX-3": "2021-03-03",
+        "MIX-4": "2021-03-05",
+        "MIX-5": "2020-01-07",
+        "MIX-6": None,
+    }
+    rejects = conn.execute("SELECT Reference_no, raw_value FROM date_rejects").fetchall()
+    assert rejects == [("MIX-6", "sometime in May")]
+
+
+def test_spatial_index_survives_vacuum(raw_db):
+    from helpers.geo import meters_in_bbox
+
+    conn = _open(raw_db)
+    migrate(conn)
+    # Gaps in the rowids are what VACUUM closes up when nothing pins them
+    conn.execute("DELETE FROM meter_data WHERE meter_id % 3 = 0")
+    conn.execute("VACUUM")
+    rows = conn.execute("""
+        SELECT Reference_no, Latitude, Longitude FROM meter_data
+        WHERE Latitude BETWEEN -90 AND 90 AND Longitude BETWEEN -180 AND 180
+        ORDER BY meter_id DESC LIMIT 20
+    """).fetchall()
+    assert rows
+    for ref, lat, lon in rows:
+        found = meters_in_bbox({}, lat - 1e-4, lat + 1e-4, lon - 1e-4, lon + 1e-4)
+        assert ref in found['Reference_no'].tolist()
+    assert conn.execute("SELECT COUNT(*) FROM meter_rtree").fetchone()[0] == \
+        conn.execute("SELECT COUNT(*) FROM meter_data JOIN meter_rtree ON meter_rtree.id = meter_data.meter_id").fetchone()[0]
@@ -0,0 +1,34 @@
+import pytest
+
+from helpers import mute_queue
+from helpers.db import reader, writer
+from helpers.mute_queue import set_mute_reason
+
+
+def _blank_refs(n):
+    return [ref for (ref,) in reader().execute(
+        "SELECT Reference_no FROM meter_data WHERE TRIM(IFNULL(mute_reason, '')) = '' LIMIT ?", (n,)
+    )]
+
+
+def _reason(ref):
+    return reader().execute("SELECT mute_reason FROM meter_data WHERE Reference_no = ?", (ref,)).fetchone()[0]
+
+
+def test_reason_is_set_once(meter_db):
+    ref, = _blank_refs(1)
+    assert set_mute_reason(ref, "Meter Burnt")
+    assert not set_mute_reason(ref, "Not Found")
+    assert _reason(ref) == "Meter Burnt"
+
+
+def test_timed_out_submission_is_withdrawn(meter_db, monkeypatch):
+    monkeypatch.setattr(mute_queue, 'SUBMIT_TIMEOUT', 0.2)
+    late, other = _blank_refs(2)
+    # An import holds the writer for longer than the page waits
+    with writer():
+        with pytest.raises(TimeoutError):
+            set_mute_reason(late, "Meter Burnt")
+    # The next batch commits without the withdrawn submission
+    assert set_mute_reason(other, "Not Found")
+    assert _reason(late) in (None, '')
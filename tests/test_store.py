@@ -0,0 +1,90 @@
+import pandas as pd
+
+from helpers.db import reader
+from helpers.queries import MUTE_CONDITION
+from helpers.store import is_mute, prepare_frame
+
+REASONS = ["Meter Burnt", "", "   ", None, " Not Found ", "None"]
+
+
+def test_is_mute_matches_sql_rule():
+    expected = [True, False, False, False, True, True]
+    frame = pd.DataFrame({'mute_reason': REASONS})
+    assert is_mute(frame).tolist() == expected
+    frame['mute_reason'] = frame['mute_reason'].astype('category')
+    assert is_mute(frame).tolist() == expected
+
+
+def test_is_mute_counts_like_mute_condition(meter_db):
+    df = prepare_frame(pd.read_sql_query("SELECT * FROM meter_data", reader()))
+    mute = reader().execute(f"SELECT COUNT(*) FROM meter_data WHERE {MUTE_CONDITION}").fetchone()[0]
+    assert int(is_mute(df).sum()) == mute
+
+
+def test_reason_chart_matches_mute_table(meter_db):
+    # Mute Analytics draws its chart from mute_summary and its table from is_mute()
+    from helpers.summary import mute_reason_counts
+
+    df = prepare_frame(pd.read_sql_query("SELECT * FROM meter_data", reader()))
+    for circle in [None] + list(df['Circle'].dropna().unique()[:2]):
+        scope = {'circle': circle} if circle else {}
+        rows = df if circle is None else df[df['Circle'] == circle]
+        table = rows[is_mute(rows)]['mute_reason'].astype(str).value_counts()
+        chart = mute_reason_counts(scope).set_index('Mute Reason')['Count']
+        assert table.sort_index().to_dict() == chart.sort_index().to_dict()
+
+
+def test_write_transaction_publishes_one_version(meter_db):
+    from helpers.batch import assign_reason
+    from helpers.db import writer
+    from helpers.store import data_version
+
+    refs = [ref for (ref,) in reader().execute("SELECT Reference_no FROM meter_data LIMIT 5")]
+    before = data_version()
+    assert assign_reason("Meter Burnt", {}, refs, only_blank=False) == 5
+    assert data_version() == before + 1
+    logged = reader().execute("SELECT version, COUNT(*) FROM meter_changes WHERE version > ?", (before,))
+    assert logged.fetchall() == [(before + 1, 5)]
+
+    # Transactions that leave meter_data alone do not move the version
+    with writer() as conn:
+        conn.execute("SELECT 1")
+    assert data_version() == before + 1
+
+
+def test_store_patches_changed_rows(meter_db):
+    from helpers.batch import assign_reason
+    from helpers.store import MeterStore
+
+    store = MeterStore()
+    before = int(is_mute(store.frame()).sum())
+    refs = [ref for (ref,) in reader().execute(
+        f"SELECT Reference_no FROM meter_data WHERE NOT {MUTE_CONDITION} LIMIT 3"
+    )]
+    assign_reason("Meter Burnt", {}, refs)
+    df = store.frame()
+    assert int(is_mute(df).sum()) == before + 3
+    assert set(df[df['Reference_no'].isin(refs)]['mute_reason']) == {"Meter Burnt"}
+
+
+def test_store_drops_deleted_rows(meter_db):
+    # The admin page deletes through writer() and relies on this sync
+    from helpers.db import writer
+    from helpers.store import MeterStore
+
+    store = MeterStore()
+    before = len(store.frame())
+    with writer() as conn:
+        conn.execute("DELETE FROM meter_data WHERE rowid IN (SELECT rowid FROM meter_data LIMIT 4)")
+    assert len(store.frame()) == before - 4
+
+
+def test_snapshot_of_another_database_is_ignored(meter_db):
+    from helpers.snapshot import read_latest_snapshot
+    from helpers.store import MeterStore, data_version, database_id
+
+    MeterStore().frame()
+    version = data_version()
+    assert read_latest_snapshot(database_id(), version) is not None
+    # A different database that reached the same version
+    assert read_latest_snapshot("0" * 32, version) is None
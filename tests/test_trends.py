@@ -0,0 +1,48 @@
+import os
+
+from streamlit.testing.v1 import AppTest
+
+from helpers.db import reader, writer
+from helpers.queries import MUTE_CONDITION
+from helpers.store import data_version
+from helpers.trends import _mttr, _trend, today
+
+PAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages")
+
+
+def test_trend_window_follows_the_day(meter_db):
+    version = data_version()
+    day = today()
+    current = _trend({}, 'day', 30, day, version)
+    tomorrow = _trend({}, 'day', 30, day + 1, version)
+    assert len(current) == len(tomorrow) == 30
+    assert tomorrow['Date'].iloc[-1] > current['Date'].iloc[-1]
+
+
+def test_mttr_counts_restorations_in_window(meter_db):
+    ref = reader().execute(f"SELECT Reference_no FROM meter_data WHERE {MUTE_CONDITION} LIMIT 1").fetchone()[0]
+    with writer() as conn:
+        conn.execute("UPDATE meter_data SET mute_reason = '' WHERE Reference_no = ?", (ref,))
+    mttr = _mttr({}, 'Sub-Division', 30, today(), data_version())
+    assert mttr['Restored'].sum() == 1
+    # Once the day rolls over, a one-day window no longer includes it
+    assert _mttr({}, 'Sub-Division', 1, today() + 1, data_version()).empty
+
+
+def test_trends_tab_shown_without_mute_meters(meter_db):
+    circle, division = reader().execute(f"""
+        SELECT Circle, Division FROM meter_data
+        GROUP BY Circle, Division HAVING SUM({MUTE_CONDITION}) = 0 LIMIT 1
+    """).fetchone()
+    at = AppTest.from_file(os.path.join(PAGES, "2_Mute_Analytics.py"), default_timeout=60)
+    at.session_state.logged_in = True
+    at.session_state.user_email = "user@sepco.com.pk"
+    at.session_state.current_page = None
+    at.session_state.user_role = "user"
+    at.session_state.access = {'circle': circle, 'division': division, 'subdivision': None, 'feeder': None}
+    at.run()
+
+    assert not at.exception
+    assert len(at.tabs) == 3
+    assert "No mute meters available for selected filters." in [w.value for w in at.warning]
+    assert any("Compare Daily Loads" in h.value for h in at.subheader)